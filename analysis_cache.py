@@ -0,0 +1,90 @@
+import os, json, time, sqlite3
+from file_manager import wit_subfolder
+
+MAX_CACHE_BYTES = 32 * 1024 * 1024
+UNKNOWN_VERSION = "unknown"
+
+
+class AnalysisCache:
+    """Caches per-file analysis results in .wit/analysis_cache, keyed by
+    (content hash, endpoint, server version), with least-recently-used eviction."""
+
+    def __init__(self, path: str, max_bytes: int = MAX_CACHE_BYTES):
+        """Initialize with repository path and open (or create) the cache database."""
+        self.path = path
+        self.max_bytes = max_bytes
+        self.db_path = os.path.join(wit_subfolder(path), "analysis_cache")
+        self.conn = sqlite3.connect(self.db_path)
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                " sha TEXT NOT NULL, endpoint TEXT NOT NULL, version TEXT NOT NULL,"
+                " result TEXT NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL,"
+                " PRIMARY KEY (sha, endpoint, version))"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS results_lru ON results (last_used)")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS servers (endpoint TEXT PRIMARY KEY, version TEXT NOT NULL)"
+            )
+
+    def server_version(self, endpoint: str) -> str:
+        """Return the last server version seen for an endpoint."""
+        row = self.conn.execute("SELECT version FROM servers WHERE endpoint = ?", (endpoint,)).fetchone()
+        return row[0] if row else UNKNOWN_VERSION
+
+    def set_server_version(self, endpoint: str, version: str):
+        """Remember the server version reported by an endpoint."""
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO servers VALUES (?, ?)", (endpoint, version))
+
+    def lookup(self, endpoint: str, hashes: dict[str, str]) -> dict[str, str | None]:
+        """Return cached results (path -> error message or None) for files given as path -> hash."""
+        version = self.server_version(endpoint)
+        found = {}
+        by_sha = {}
+        for rel_path, sha in hashes.items():
+            by_sha.setdefault(sha, []).append(rel_path)
+        shas = list(by_sha)
+        for start in range(0, len(shas), 500):
+            chunk = shas[start:start + 500]
+            rows = self.conn.execute(
+                f"SELECT sha, result FROM results WHERE endpoint = ? AND version = ?"
+                f" AND sha IN ({','.join('?' * len(chunk))})",
+                [endpoint, version, *chunk],
+            )
+            for sha, result in rows:
+                for rel_path in by_sha[sha]:
+                    found[rel_path] = json.loads(result)["error"]
+        if found:
+            with self.conn:
+                self.conn.executemany(
+                    "UPDATE results SET last_used = ? WHERE sha = ? AND endpoint = ? AND version = ?",
+                    [(time.time(), hashes[p], endpoint, version) for p in found],
+                )
+        return found
+
+    def store(self, endpoint: str, version: str, results: dict[str, str | None]):
+        """Cache results given as content hash -> error message (None for a clean file)."""
+        now = time.time()
+        rows = []
+        for sha, error in results.items():
+            result = json.dumps({"error": error})
+            rows.append((sha, endpoint, version, result, len(result) + len(sha), now))
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)", rows)
+        self.evict()
+
+    def evict(self):
+        """Drop least recently used results until the cache fits in max_bytes."""
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        stale = []
+        for rowid, size in self.conn.execute("SELECT rowid, size FROM results ORDER BY last_used"):
+            stale.append((rowid,))
+            excess -= size
+            if excess <= 0:
+                break
+        with self.conn:
+            self.conn.executemany("DELETE FROM results WHERE rowid = ?", stale)
@@ -0,0 +1,74 @@
+"""
+Compare two benchmark result files (from benchmarks/run.py) and flag regressions.
+
+Example:  python benchmarks/compare.py before.json after.json --threshold 10
+Exits with status 1 when any compared metric got worse by more than the threshold.
+"""
+
+import json
+import click
+
+METRICS = ("wall_s", "max_rss_kb", "syscr", "syscw", "rchar", "wchar")
+# Changes smaller than these are noise, however large they are relative to the baseline.
+NOISE_FLOOR = {"wall_s": 0.005, "max_rss_kb": 1024, "syscr": 50, "syscw": 50, "rchar": 64 * 1024, "wchar": 64 * 1024}
+
+
+def _load(path: str) -> dict:
+    """Read a result file."""
+    with open(path) as file:
+        return json.load(file)
+
+
+def compare(baseline: dict, current: dict, threshold: float, metrics=METRICS) -> list[tuple]:
+    """Return (command, metric, baseline value, current value, change %, regressed) for shared metrics."""
+    rows = []
+    for command, before in baseline["summary"].items():
+        after = current["summary"].get(command)
+        if after is None:
+            continue
+        for metric in metrics:
+            if metric not in before or metric not in after:
+                continue
+            old, new = before[metric], after[metric]
+            change = (new - old) / old * 100 if old else 0.0
+            regressed = change > threshold and new - old > NOISE_FLOOR.get(metric, 0)
+            rows.append((command, metric, old, new, change, regressed))
+    return rows
+
+
+def _describe(result: dict) -> str:
+    """Name the revision a result file measured."""
+    revision = result.get("revision") or {}
+    commit = (revision.get("commit") or "unknown")[:10]
+    return commit + (" (with local changes)" if revision.get("dirty") else "")
+
+
+@click.command()
+@click.argument('baseline', type=click.Path(exists=True, dir_okay=False))
+@click.argument('current', type=click.Path(exists=True, dir_okay=False))
+@click.option('--threshold', type=click.FloatRange(min=0), default=10.0, show_default=True,
+              help='Percentage by which a metric may grow before it counts as a regression')
+@click.option('--metric', 'metrics', multiple=True, type=click.Choice(METRICS),
+              help='Metric to compare (repeatable; default: all)')
+def main(baseline, current, threshold, metrics):
+    """
+    Compare CURRENT benchmark results against BASELINE.
+    """
+    before, after = _load(baseline), _load(current)
+    if before.get("spec") != after.get("spec"):
+        click.echo("warning: the two runs used different repository specs.", err=True)
+    click.echo(f"baseline {_describe(before)}  vs  current {_describe(after)}  (threshold {threshold:g}%)")
+    rows = compare(before, after, threshold, metrics or METRICS)
+    click.echo(f"{'command':<20} {'metric':<11} {'baseline':>12} {'current':>12} {'change':>8}")
+    for command, metric, old, new, change, regressed in rows:
+        mark = "  REGRESSION" if regressed else ""
+        click.echo(f"{command:<20} {metric:<11} {old:12.4g} {new:12.4g} {change:+7.1f}%{mark}")
+    regressions = [row for row in rows if row[5]]
+    if regressions:
+        click.echo(f"{len(regressions)} regression(s) above {threshold:g}%.")
+        raise SystemExit(1)
+    click.echo("No regressions.")
+
+
+if __name__ == "__main__":
+    main()
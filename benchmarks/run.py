@@ -0,0 +1,221 @@
+"""
+Benchmark harness: builds a synthetic repository and times every wit command on it.
+
+Each command runs as its own process, as a user would run it. For each run the harness records
+wall time, CPU time and peak RSS (from wait4) and, on Linux, read/write syscalls and I/O bytes
+(from /proc/<pid>/io, read before the process is reaped). Results are written as JSON; compare
+two result files with benchmarks/compare.py.
+
+Example:  python benchmarks/run.py --files 2000 --history 20 --repeat 3 -o before.json
+"""
+
+import os, sys, json, time, shutil, platform, statistics, subprocess, tempfile
+from datetime import datetime
+import click
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from synthetic import RepoSpec, generate, mutate
+from stub_server import StubServer
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WIT = os.path.join(REPO_ROOT, "wit.py")
+PROC_IO_FIELDS = ("rchar", "wchar", "syscr", "syscw", "read_bytes", "write_bytes")
+
+
+class CommandFailed(Exception):
+    """A timed wit command exited with an error."""
+
+
+def _read_proc_io(pid: int) -> dict:
+    """Read the I/O counters of a finished (not yet reaped) process; {} where /proc is unavailable."""
+    try:
+        with open(f"/proc/{pid}/io") as file:
+            fields = dict(line.split(": ") for line in file.read().splitlines())
+    except OSError:
+        return {}
+    return {name: int(fields[name]) for name in PROC_IO_FIELDS if name in fields}
+
+
+def measure(argv: list[str], cwd: str, log_path: str, env: dict) -> dict:
+    """Run argv in cwd with output appended to log_path; return its resource usage."""
+    with open(log_path, "ab") as log:
+        log.write(f"$ {' '.join(argv[1:])}\n".encode())
+    start = time.perf_counter()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.chdir(cwd)
+            fd = os.open(log_path, os.O_WRONLY | os.O_APPEND)
+            os.dup2(fd, 1)
+            os.dup2(fd, 2)
+            os.execve(argv[0], argv, env)
+        finally:
+            os._exit(127)
+    # Wait without reaping so /proc/<pid>/io can still be read.
+    os.waitid(os.P_PID, pid, os.WEXITED | os.WNOWAIT)
+    wall = time.perf_counter() - start
+    io = _read_proc_io(pid)
+    _, status, usage = os.wait4(pid, 0)
+    return {
+        "wall_s": wall,
+        "user_s": usage.ru_utime,
+        "sys_s": usage.ru_stime,
+        # Kilobytes on Linux (bytes on macOS).
+        "max_rss_kb": usage.ru_maxrss,
+        "minor_faults": usage.ru_minflt,
+        "major_faults": usage.ru_majflt,
+        **io,
+        "exit_code": os.waitstatus_to_exitcode(status),
+    }
+
+
+class Scenario:
+    """One pass over all commands on a freshly generated repository."""
+
+    def __init__(self, spec: RepoSpec, workdir: str, server_url: str):
+        """Prepare the folder, log file and environment for the wit processes."""
+        self.spec = spec
+        self.repo = os.path.join(workdir, "repo")
+        self.log_path = os.path.join(workdir, "wit.log")
+        self.env = {**os.environ, "WIT_SERVER_URL": server_url}
+        self.results = {}
+
+    def wit(self, *args: str) -> str:
+        """Run an untimed wit command and return its output."""
+        result = subprocess.run([sys.executable, WIT, *args], cwd=self.repo, env=self.env,
+                                capture_output=True, text=True)
+        if result.returncode:
+            raise CommandFailed(f"wit {' '.join(args)}: {result.stdout}{result.stderr}")
+        return result.stdout
+
+    def timed(self, name: str, *args: str):
+        """Run and measure one wit command under a result name."""
+        sample = measure([sys.executable, WIT, *args], self.repo, self.log_path, self.env)
+        if sample["exit_code"]:
+            raise CommandFailed(f"wit {' '.join(args)} exited with {sample['exit_code']}; see {self.log_path}")
+        self.results[name] = sample
+
+    def run(self) -> dict:
+        """Generate the repository, build its history and time each command; return {name: sample}."""
+        os.makedirs(self.repo)
+        paths = generate(self.repo, self.spec)
+        self.timed("init", "init")
+        self.timed("add_initial", "add", ".")
+        self.timed("commit_initial", "commit", "-m", "initial")
+        for round_number in range(1, self.spec.history):
+            mutate(self.repo, self.spec, paths, round_number)
+            if round_number < self.spec.history - 1:
+                self.wit("add", ".")
+                self.wit("commit", "-m", f"round {round_number}")
+            else:
+                self.timed("add_incremental", "add", ".")
+                self.timed("commit_incremental", "commit", "-m", f"round {round_number}")
+        self.timed("log", "log")
+        self.timed("log_oneline_10", "log", "--oneline", "-n", "10")
+        first = self.wit("log", "--oneline").splitlines()[-1].split()[0]
+        self.timed("checkout_old", "checkout", first)
+        self.timed("checkout_branch", "checkout", "master")
+        self.timed("push", "push")
+        self.timed("analyze", "analyze")
+        self.timed("status_clean", "status")
+        mutate(self.repo, self.spec, paths, self.spec.history)
+        self.timed("status_dirty", "status")
+        self.timed("diff", "diff")
+        self.timed("diff_stat", "diff", "--stat")
+        self.timed("repack", "repack")
+        self.timed("fsck", "fsck")
+        return self.results
+
+
+def summarize(runs: list[dict]) -> dict:
+    """Reduce repeated runs to the median of each metric per command."""
+    summary = {}
+    for name in runs[0]:
+        samples = [run[name] for run in runs]
+        summary[name] = {
+            metric: statistics.median(sample[metric] for sample in samples)
+            for metric in samples[0] if metric != "exit_code"
+        }
+    return summary
+
+
+def _revision() -> dict:
+    """Describe the checked-out revision of wit being measured."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_ROOT,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+    return {"commit": commit, "dirty": dirty}
+
+
+@click.command()
+@click.option('--files', type=click.IntRange(min=1), default=1000, show_default=True, help='Files in the repository')
+@click.option('--depth', type=click.IntRange(min=0), default=3, show_default=True, help='Folder nesting depth')
+@click.option('--min-size', type=click.IntRange(min=1), default=200, show_default=True, help='Smallest file size in bytes')
+@click.option('--max-size', type=click.IntRange(min=1), default=64 * 1024, show_default=True,
+              help='Largest file size in bytes (sizes are log-uniform in between)')
+@click.option('--binary-fraction', type=click.FloatRange(0, 1), default=0.1, show_default=True,
+              help='Share of binary files')
+@click.option('--py-fraction', type=click.FloatRange(0, 1), default=0.5, show_default=True,
+              help='Share of text files that are Python (sent by push/analyze)')
+@click.option('--history', type=click.IntRange(min=1), default=10, show_default=True, help='Number of commits')
+@click.option('--change-fraction', type=click.FloatRange(0, 1), default=0.05, show_default=True,
+              help='Share of files each commit changes')
+@click.option('--seed', type=int, default=0, show_default=True, help='Random seed (same seed, same repository)')
+@click.option('--repeat', type=click.IntRange(min=1), default=3, show_default=True,
+              help='Passes over fresh repositories; results are medians')
+@click.option('--workdir', type=click.Path(file_okay=False), default=None,
+              help='Where to build repositories (default: a temporary folder, removed afterwards)')
+@click.option('-o', '--output', type=click.Path(dir_okay=False), default=None, help='Write the JSON results here')
+def main(files, depth, min_size, max_size, binary_fraction, py_fraction, history, change_fraction, seed,
+         repeat, workdir, output):
+    """
+    Time every wit command on a synthetic repository.
+    """
+    if not hasattr(os, "fork"):
+        raise click.ClickException("the benchmark harness needs os.fork (Linux or macOS).")
+    spec = RepoSpec(files, depth, min_size, max_size, binary_fraction, py_fraction, history, change_fraction, seed)
+    base = workdir or tempfile.mkdtemp(prefix="wit-bench-")
+    runs = []
+    try:
+        with StubServer() as server:
+            for number in range(repeat):
+                run_dir = os.path.join(base, f"run-{number}")
+                shutil.rmtree(run_dir, ignore_errors=True)
+                click.echo(f"Pass {number + 1}/{repeat} in {run_dir} ...", err=True)
+                try:
+                    runs.append(Scenario(spec, run_dir, server.url).run())
+                except CommandFailed as e:
+                    raise click.ClickException(str(e))
+    finally:
+        if workdir is None:
+            shutil.rmtree(base, ignore_errors=True)
+    summary = summarize(runs)
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "revision": _revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "spec": spec.to_dict(),
+        "repeat": repeat,
+        "summary": summary,
+        "runs": runs,
+    }
+    click.echo(f"{'command':<20} {'wall ms':>9} {'cpu ms':>9} {'peak RSS MB':>12} {'read MB':>9} {'write MB':>9}")
+    for name, metrics in summary.items():
+        click.echo(
+            f"{name:<20} {metrics['wall_s'] * 1000:9.1f} {(metrics['user_s'] + metrics['sys_s']) * 1000:9.1f}"
+            f" {metrics['max_rss_kb'] / 1024:12.1f} {metrics.get('rchar', 0) / 2 ** 20:9.2f}"
+            f" {metrics.get('wchar', 0) / 2 ** 20:9.2f}"
+        )
+    if output:
+        with open(output, "w") as file:
+            json.dump(report, file, indent=2)
+        click.echo(f"Results written to {output}", err=True)
+
+
+if __name__ == "__main__":
+    main()
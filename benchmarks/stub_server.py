@@ -0,0 +1,83 @@
+"""
+A local stand-in for the analysis server, so `push` and `analyze` can be timed without a network.
+It accepts the multipart uploads wit sends (chunked or with a Content-Length) and answers success.
+
+Run it by hand with:  python benchmarks/stub_server.py [PORT]
+and point wit at it:  WIT_SERVER_URL=http://127.0.0.1:PORT wit push
+"""
+
+import re, sys, json, threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+FILE_NAME = re.compile(rb'; filename="')
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answers every POST with a success reply listing how many files it received."""
+
+    protocol_version = "HTTP/1.1"
+
+    def _read_body(self) -> bytes:
+        """Read the request body, decoding chunked transfer encoding."""
+        if self.headers.get("Transfer-Encoding", "").lower() != "chunked":
+            return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        chunks = []
+        while True:
+            size = int(self.rfile.readline().split(b";")[0], 16)
+            if not size:
+                self.rfile.readline()
+                return b"".join(chunks)
+            chunks.append(self.rfile.read(size))
+            self.rfile.readline()
+
+    def do_POST(self):
+        """Consume an upload and reply like the real server does when every file passes."""
+        body = self._read_body()
+        files = len(FILE_NAME.findall(body))
+        self.server.received.append((self.path, files, len(body)))
+        reply = json.dumps({
+            "status": "success", "errors": [], "server_version": "stub",
+            "message": f"Stub server received {files} file(s), {len(body)} bytes.",
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(reply)))
+        self.end_headers()
+        self.wfile.write(reply)
+
+    def log_message(self, format, *args):
+        """Keep the benchmark output quiet."""
+
+
+class StubServer:
+    """Runs a StubHandler (or subclass) server on a background thread (port 0 picks a free port)."""
+
+    def __init__(self, port: int = 0, handler=StubHandler):
+        """Bind the server on localhost."""
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), handler)
+        self.httpd.daemon_threads = True
+        self.httpd.received = []
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        """The base URL to put in WIT_SERVER_URL."""
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8000
+    with StubServer(port) as server:
+        print(f"Stub analysis server on {server.url}. Press Ctrl-C to stop.")
+        try:
+            server.thread.join()
+        except KeyboardInterrupt:
+            pass
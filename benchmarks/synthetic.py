@@ -0,0 +1,109 @@
+import os, math, random
+
+WORDS = ("value", "total", "count", "index", "buffer", "result", "item", "node", "path", "size")
+
+
+class RepoSpec:
+    """The shape of a synthetic repository."""
+
+    def __init__(self, files=1000, depth=3, min_size=200, max_size=64 * 1024, binary_fraction=0.1,
+                 py_fraction=0.5, history=10, change_fraction=0.05, seed=0):
+        """File count, folder depth, file sizes (log-uniform between min_size and max_size in bytes),
+        the share of binary and Python files, commits of history and the share of files each commit changes."""
+        self.files = files
+        self.depth = depth
+        self.min_size = min_size
+        self.max_size = max_size
+        self.binary_fraction = binary_fraction
+        self.py_fraction = py_fraction
+        self.history = history
+        self.change_fraction = change_fraction
+        self.seed = seed
+
+    def to_dict(self) -> dict:
+        """Return the spec as a JSON-friendly dict."""
+        return dict(vars(self))
+
+
+def _size(spec: RepoSpec, rng: random.Random) -> int:
+    """Draw a file size; log-uniform, so most files are small and a few are large."""
+    low, high = math.log(max(1, spec.min_size)), math.log(max(spec.min_size, spec.max_size, 1))
+    return int(math.exp(rng.uniform(low, high)))
+
+
+def _text(size: int, rng: random.Random) -> bytes:
+    """Return Python-like source of about size bytes."""
+    lines = []
+    length = 0
+    while length < size:
+        word = rng.choice(WORDS)
+        line = f"{word}_{rng.randrange(10 ** 6)} = {word}_{rng.randrange(1000)} + {rng.randrange(10 ** 9)}\n"
+        lines.append(line)
+        length += len(line)
+    return "".join(lines).encode()
+
+
+def _folder(spec: RepoSpec, number: int) -> str:
+    """Place file number in a folder tree spec.depth levels deep with about equal fan-out."""
+    if spec.depth <= 0:
+        return ""
+    fanout = max(2, round(spec.files ** (1 / (spec.depth + 1))))
+    parts = []
+    for level in range(spec.depth):
+        number //= fanout
+        parts.append(f"d{level}_{number % fanout}")
+    return os.path.join(*parts)
+
+
+def _new_file(spec: RepoSpec, number: int, rng: random.Random) -> tuple[str, bytes]:
+    """Return (relative path, content) of one generated file."""
+    size = _size(spec, rng)
+    if rng.random() < spec.binary_fraction:
+        name, content = f"blob_{number}.bin", rng.randbytes(size)
+    else:
+        extension = ".py" if rng.random() < spec.py_fraction else ".txt"
+        name, content = f"file_{number}{extension}", _text(size, rng)
+    return os.path.join(_folder(spec, number), name), content
+
+
+def _write(root: str, rel_path: str, content: bytes):
+    """Write one file, creating its folder."""
+    full_path = os.path.join(root, rel_path)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    with open(full_path, "wb") as file:
+        file.write(content)
+
+
+def generate(root: str, spec: RepoSpec) -> list[str]:
+    """Fill root with spec.files files; return their relative paths (same seed, same tree)."""
+    rng = random.Random(spec.seed)
+    paths = []
+    for number in range(spec.files):
+        rel_path, content = _new_file(spec, number, rng)
+        _write(root, rel_path, content)
+        paths.append(rel_path)
+    return paths
+
+
+def mutate(root: str, spec: RepoSpec, paths: list[str], round_number: int) -> list[str]:
+    """Make one round of changes like a commit would: edit some text files and add one file.
+
+    Returns the changed paths; paths is extended with the new file.
+    """
+    rng = random.Random(f"{spec.seed}-{round_number}")
+    text_paths = [p for p in paths if not p.endswith(".bin")]
+    count = min(len(text_paths), max(1, round(len(paths) * spec.change_fraction)))
+    changed = rng.sample(text_paths, count)
+    for rel_path in changed:
+        full_path = os.path.join(root, rel_path)
+        with open(full_path, "rb") as file:
+            lines = file.read().splitlines(keepends=True)
+        for _ in range(max(1, len(lines) // 50) if lines else 0):
+            lines[rng.randrange(len(lines))] = _text(1, rng)
+        lines.append(_text(1, rng))
+        with open(full_path, "wb") as file:
+            file.writelines(lines)
+    rel_path, content = _new_file(spec, len(paths), rng)
+    _write(root, rel_path, content)
+    paths.append(rel_path)
+    return changed + [rel_path]
@@ -0,0 +1,86 @@
+import io, os, mmap, random
+
+# Files at least this large are stored as content-defined chunks instead of one blob.
+LARGE_FILE_THRESHOLD = int(os.environ.get("WIT_LARGE_FILE_THRESHOLD", 32 * 1024 * 1024))
+MIN_CHUNK = 256 * 1024
+MAX_CHUNK = 8 * 1024 * 1024
+# A chunk ends where the gear bits of the last BOUNDARY_BITS bytes form a fixed pattern:
+# about every 2 ** BOUNDARY_BITS bytes (1 MB) past MIN_CHUNK in high-entropy data. Very
+# repetitive content may never match and is then cut every MAX_CHUNK bytes.
+BOUNDARY_BITS = 20
+
+
+def _half_bits(count: int, rng: random.Random) -> bytes:
+    """Return count bytes of 0 and 1, half of them 1, in a seeded random order."""
+    bits = [1] * (count // 2) + [0] * (count - count // 2)
+    rng.shuffle(bits)
+    return bytes(bits)
+
+
+_rng = random.Random(0x77697421)
+# One bit per byte value; the pattern is balanced so skewed byte distributions (text)
+# match it far more often than an all-ones pattern would.
+GEAR = _half_bits(256, _rng)
+BOUNDARY = _half_bits(BOUNDARY_BITS, _rng)
+
+
+def find_cut(data, start: int, end: int) -> int:
+    """Return where the chunk starting at start ends.
+
+    The cut depends only on the BOUNDARY_BITS bytes before it, so inserting or deleting
+    bytes moves the following cut points along with the content instead of shifting
+    every later chunk. bytes.translate and bytes.find do the scanning in C.
+    """
+    if end - start <= MIN_CHUNK:
+        return end
+    limit = min(end, start + MAX_CHUNK)
+    window_start = start + MIN_CHUNK - BOUNDARY_BITS
+    found = data[window_start:limit].translate(GEAR).find(BOUNDARY)
+    return window_start + found + BOUNDARY_BITS if found >= 0 else limit
+
+
+def iter_chunks(file_path: str):
+    """Yield the content-defined chunks of a file, read through mmap."""
+    with open(file_path, "rb") as file:
+        size = os.fstat(file.fileno()).st_size
+        if not size:
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            start = 0
+            while start < size:
+                cut = find_cut(data, start, size)
+                yield data[start:cut]
+                start = cut
+
+
+class ChunkedReader(io.RawIOBase):
+    """Reads a chunked object as one stream, opening one chunk at a time."""
+
+    def __init__(self, open_chunk, chunk_shas: list[str]):
+        """open_chunk(sha) returns a binary file object for one chunk."""
+        self.open_chunk = open_chunk
+        self.pending = list(reversed(chunk_shas))
+        self.current = None
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        """Fill buffer from the current chunk, moving to the next one when it runs out."""
+        while True:
+            if self.current is None:
+                if not self.pending:
+                    return 0
+                self.current = self.open_chunk(self.pending.pop())
+            count = self.current.readinto(buffer)
+            if count:
+                return count
+            self.current.close()
+            self.current = None
+
+    def close(self):
+        """Close the open chunk."""
+        if self.current is not None:
+            self.current.close()
+            self.current = None
+        super().close()
@@ -2,19 +2,25 @@ from datetime import datetime
 import hashlib
 
 class Commit:
-    """A commit object with message, timestamp, and unique hash."""
+    """A commit object with message, timestamp, parent and tree hashes, and a unique hash."""
 
-    def __init__(self, message, hash_code=None, timestamp=None):
-        """Initialize commit with message and optional hash/timestamp."""
+    def __init__(self, message, hash_code=None, timestamp=None, parent=None, tree=None):
+        """Initialize commit with message and optional hash/timestamp/parent/tree."""
         self.timestamp = timestamp or datetime.now().isoformat()
         self.message = message
+        self.parent = parent
+        self.tree = tree
         self.hash_code = hash_code or self._generate_hash()
 
     def _generate_hash(self):
-        """Generate a short SHA-1 hash from timestamp and message."""
-        data = f"{self.timestamp}_{self.message}".encode()
+        """Generate a short SHA-1 hash over the tree, parent, timestamp and message."""
+        data = f"tree {self.tree or ''}\nparent {self.parent or ''}\n{self.timestamp}_{self.message}".encode()
         return hashlib.sha1(data).hexdigest()[:10]
 
+    def oneline(self):
+        """Return the short hash and the first line of the message."""
+        return f"{self.hash_code} {self.message.splitlines()[0] if self.message else ''}"
+
     def __str__(self):
         """Return Git-like string representation of the commit."""
         return f"commit {self.hash_code}\nDate:   {self.timestamp}\n\n    {self.message}"
@@ -5,10 +5,10 @@ from file_manager import wit_subfolder
 class CommitDataCSV:
     """Handles reading and writing commit metadata to a CSV file."""
 
-    def __init__(self, path: str):
-        """Initialize with repository path."""
+    def __init__(self, path: str, csv_path: str | None = None):
+        """Initialize with repository path (and a CSV file other than .wit/data.csv, if given)."""
         self.path = path
-        self.csv_path = os.path.join(wit_subfolder(path), "data.csv")
+        self.csv_path = csv_path or os.path.join(wit_subfolder(path), "data.csv")
 
     def write(self, commit: Commit):
         """Append a new commit to the CSV file."""
@@ -17,6 +17,13 @@ class CommitDataCSV:
             writer = csv.writer(file)
             writer.writerow([commit.hash_code, commit.message, commit.timestamp])
 
+    def write_all(self, commits: list[Commit]):
+        """Overwrite the CSV file with the given commits."""
+        os.makedirs(os.path.dirname(os.path.abspath(self.csv_path)), exist_ok=True)
+        with open(self.csv_path, "w", newline='') as file:
+            writer = csv.writer(file)
+            writer.writerows([c.hash_code, c.message, c.timestamp] for c in commits)
+
     def read_all(self) -> list[Commit]:
         """Return all commits from the CSV file."""
         commits = []
@@ -43,3 +50,10 @@ class CommitDataCSV:
     def is_empty(self) -> bool:
         """Check if the CSV file has any commits."""
         return not os.path.exists(self.csv_path) or os.stat(self.csv_path).st_size == 0
+
+    def retire(self):
+        """Rename an imported CSV file to data.csv.imported, so it is not mistaken for current history."""
+        try:
+            os.replace(self.csv_path, self.csv_path + ".imported")
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,109 @@
+import os, sqlite3, string
+from commit import Commit
+from file_manager import wit_subfolder
+
+HEX_DIGITS = set(string.hexdigits)
+COLUMNS = "hash, message, timestamp, parent, tree"
+
+
+class CommitDataSQLite:
+    """Stores commit metadata in an indexed SQLite database (.wit/commits.db)."""
+
+    def __init__(self, path: str):
+        """Initialize with repository path and open (or create) the database."""
+        self.path = path
+        self.db_path = os.path.join(wit_subfolder(path), "commits.db")
+        self.is_new = not os.path.exists(self.db_path)
+        self.conn = sqlite3.connect(self.db_path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS commits ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " hash TEXT NOT NULL UNIQUE,"
+            " message TEXT NOT NULL,"
+            " timestamp TEXT NOT NULL,"
+            " parent TEXT,"
+            " tree TEXT)"
+        )
+        self.upgraded = self._add_missing_columns()
+
+    def _add_missing_columns(self) -> bool:
+        """Add the parent/tree columns to databases created before they existed."""
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(commits)")}
+        if "parent" in columns:
+            return False
+        with self.conn:
+            self.conn.execute("ALTER TABLE commits ADD COLUMN parent TEXT")
+            self.conn.execute("ALTER TABLE commits ADD COLUMN tree TEXT")
+        return True
+
+    @staticmethod
+    def _to_commit(row) -> Commit | None:
+        """Build a Commit from a (hash, message, timestamp, parent, tree) row."""
+        return Commit(row[1], row[0], row[2], row[3], row[4]) if row else None
+
+    def write(self, commit: Commit):
+        """Store a new commit."""
+        self.write_many([commit])
+
+    def write_many(self, commits: list[Commit]):
+        """Store several commits in a single transaction."""
+        with self.conn:
+            self.conn.executemany(
+                f"INSERT OR IGNORE INTO commits ({COLUMNS}) VALUES (?, ?, ?, ?, ?)",
+                [(c.hash_code, c.message, c.timestamp, c.parent, c.tree) for c in commits],
+            )
+
+    def delete(self, hash_code: str):
+        """Delete a commit by its hash."""
+        with self.conn:
+            self.conn.execute("DELETE FROM commits WHERE hash = ?", (hash_code,))
+
+    def link_parents_in_order(self):
+        """Set each commit without a parent to the commit stored before it (for imported history)."""
+        hashes = [row[0] for row in self.conn.execute("SELECT hash FROM commits ORDER BY seq")]
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE commits SET parent = ? WHERE hash = ? AND parent IS NULL",
+                list(zip(hashes, hashes[1:])),
+            )
+
+    def set_trees(self, trees: dict[str, str]):
+        """Set the tree hash of commits (commit hash -> tree hash)."""
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE commits SET tree = ? WHERE hash = ?",
+                [(tree, hash_code) for hash_code, tree in trees.items()],
+            )
+
+    def read_all(self) -> list[Commit]:
+        """Return all commits, oldest first."""
+        rows = self.conn.execute(f"SELECT {COLUMNS} FROM commits ORDER BY seq")
+        return [self._to_commit(row) for row in rows]
+
+    def read_last(self) -> Commit | None:
+        """Return the most recent commit, or None if no commits."""
+        row = self.conn.execute(
+            f"SELECT {COLUMNS} FROM commits ORDER BY seq DESC LIMIT 1"
+        ).fetchone()
+        return self._to_commit(row)
+
+    def read_by_hash(self, hash_code: str) -> Commit | None:
+        """Return a commit by its hash, or None if not found."""
+        row = self.conn.execute(
+            f"SELECT {COLUMNS} FROM commits WHERE hash = ?", (hash_code,)
+        ).fetchone()
+        return self._to_commit(row)
+
+    def read_by_prefix(self, prefix: str, limit: int = 2) -> list[Commit]:
+        """Return up to `limit` commits whose hash starts with the given prefix."""
+        if not prefix or not set(prefix) <= HEX_DIGITS:
+            return []
+        rows = self.conn.execute(
+            f"SELECT {COLUMNS} FROM commits WHERE hash GLOB ? LIMIT ?",
+            (prefix.lower() + "*", limit),
+        )
+        return [self._to_commit(row) for row in rows]
+
+    def is_empty(self) -> bool:
+        """Check if the database has any commits."""
+        return self.conn.execute("SELECT 1 FROM commits LIMIT 1").fetchone() is None
@@ -1,5 +1,12 @@
+import re
+from datetime import datetime
 from commit import Commit
 from commit_data_csv import CommitDataCSV
+from commit_data_sqlite import CommitDataSQLite
+from refs import Refs
+import tracing
+
+MIN_PREFIX = 4
 
 class CommitManager:
     """
@@ -8,35 +15,130 @@ class CommitManager:
 
     def __init__(self, path: str):
         self.path = path
-        self.data = CommitDataCSV(path)
+        with tracing.span("open commit database"):
+            self.data = CommitDataSQLite(path)
+            self.refs = Refs(path)
+            if self.data.is_new:
+                self.import_csv()
+            elif self.data.upgraded:
+                self.data.link_parents_in_order()
+            if not self.refs.exists():
+                last = self.data.read_last()
+                self.refs.init(last.hash_code if last else None)
+
+    def import_csv(self):
+        """Imports commits from a legacy data.csv file into the metadata store, then retires the file."""
+        csv_data = CommitDataCSV(self.path)
+        if not csv_data.is_empty():
+            self.data.write_many(csv_data.read_all())
+            self.data.link_parents_in_order()
+        # data.csv is never updated again, so it must not look like the current history.
+        csv_data.retire()
+
+    def adopt_trees(self, trees: dict[str, str]):
+        """Records tree hashes (commit hash -> tree hash) for commits migrated from older layouts."""
+        self.data.set_trees(trees)
 
-    def save(self, message: str) -> Commit:
-        """Creates and stores a new commit with the given message."""
-        commit = Commit(message)
+    def export_csv(self, csv_path: str) -> int:
+        """Writes all commits to a CSV file for tools that read the CSV format; returns how many."""
+        commits = self.data.read_all()
+        CommitDataCSV(self.path, csv_path).write_all(commits)
+        return len(commits)
+
+    def create(self, message: str, tree: str | None = None) -> Commit:
+        """Returns a new commit on top of HEAD, without storing it yet."""
+        return Commit(message, parent=self.get_last_hash(), tree=tree)
+
+    def publish(self, commit: Commit):
+        """Stores a commit, then moves HEAD to it; the ref update is what makes it visible."""
         self.data.write(commit)
+        self.refs.update_head(commit.hash_code)
+
+    def discard(self, hash_code: str):
+        """Deletes a stored commit that no ref points to (e.g. left by an interrupted commit)."""
+        self.data.delete(hash_code)
+
+    def save(self, message: str, tree: str | None = None) -> Commit:
+        """Creates a commit on top of HEAD, stores it and moves HEAD to it."""
+        commit = self.create(message, tree)
+        self.publish(commit)
         return commit
 
     def get_by_hash(self, hash_code: str) -> Commit | None:
         """Returns the commit matching the given hash, if exists."""
         return self.data.read_by_hash(hash_code)
 
+    def resolve(self, hash_prefix: str) -> list[Commit]:
+        """Returns the commits matching a hash prefix (at most two, to detect ambiguity)."""
+        return self.data.read_by_prefix(hash_prefix)
+
+    def find(self, revision: str) -> list[Commit]:
+        """Returns the commits a revision names: HEAD, a branch, a full hash or a unique hash prefix.
+
+        A single result is a match; two results mean the prefix is ambiguous.
+        """
+        if revision == "HEAD":
+            hash_code = self.get_last_hash()
+        else:
+            hash_code = self.refs.branch_commit(revision)
+        if hash_code:
+            commit = self.data.read_by_hash(hash_code)
+            return [commit] if commit else []
+        commit = self.data.read_by_hash(revision)
+        if commit:
+            return [commit]
+        return self.resolve(revision) if len(revision) >= MIN_PREFIX else []
+
     def get_last_commit(self) -> Commit | None:
-        """Returns the most recent commit."""
-        return self.data.read_last()
+        """Returns the commit HEAD points to."""
+        hash_code = self.get_last_hash()
+        return self.data.read_by_hash(hash_code) if hash_code else None
 
     def get_last_hash(self) -> str | None:
-        """Returns the hash of the last commit."""
-        last = self.get_last_commit()
-        return last.hash_code if last else None
+        """Returns the hash of the commit HEAD points to."""
+        return self.refs.head_commit()
+
+    def iter_history(self, start: str | None = None, limit: int | None = None):
+        """Yields commits from start (default HEAD) back through their parents, newest first."""
+        hash_code = start or self.get_last_hash()
+        count = 0
+        while hash_code and (limit is None or count < limit):
+            commit = self.data.read_by_hash(hash_code)
+            if commit is None:
+                return
+            tracing.count("commits read")
+            yield commit
+            count += 1
+            hash_code = commit.parent
 
     def is_empty(self) -> bool:
         """Checks if there are no commits."""
         return self.data.is_empty()
 
-    def print_all(self):
-        """Prints all commits."""
-        for commit in self.data.read_all():
-            print(commit)
+    def filter_history(self, start: str | None = None, limit: int | None = None,
+                       since: datetime | None = None, until: datetime | None = None,
+                       pattern: str | None = None):
+        """Yields the commits of iter_history that fall in [since, until] and whose message matches pattern."""
+        regex = re.compile(pattern) if pattern else None
+        count = 0
+        for commit in self.iter_history(start):
+            if limit is not None and count >= limit:
+                return
+            when = datetime.fromisoformat(commit.timestamp)
+            if since and when < since:
+                # History is walked newest first, so nothing older can match.
+                return
+            if until and when > until:
+                continue
+            if regex and not regex.search(commit.message):
+                continue
+            count += 1
+            yield commit
+
+    def print_all(self, limit: int | None = None, oneline: bool = False, **filters):
+        """Prints the history of HEAD (or filters["start"]), newest first, one commit at a time."""
+        for commit in self.filter_history(limit=limit, **filters):
+            print(commit.oneline() if oneline else commit)
 
     def get_all_commits(self) -> list[Commit]:
         """Returns a list of all commits."""
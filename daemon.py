@@ -0,0 +1,311 @@
+import os, io, json, stat, errno, struct, select, signal, socket, ctypes, ctypes.util
+from contextlib import redirect_stdout
+from datetime import datetime
+from file_manager import wit_subfolder, walk_rules, scan_folder
+from daemon_client import socket_path, daemon_request
+from repository import Repository
+
+REFRESH_SECONDS = 1.0
+IN_MODIFY, IN_ATTRIB, IN_CLOSE_WRITE = 0x2, 0x4, 0x8
+IN_MOVED_FROM, IN_MOVED_TO, IN_CREATE, IN_DELETE = 0x40, 0x80, 0x100, 0x200
+IN_Q_OVERFLOW, IN_IGNORED, IN_ONLYDIR = 0x4000, 0x8000, 0x1000000
+IN_NONBLOCK, IN_CLOEXEC = os.O_NONBLOCK, getattr(os, "O_CLOEXEC", 0o2000000)
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+              | IN_CREATE | IN_DELETE | IN_ONLYDIR)
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class WatchError(OSError):
+    """A folder could not be watched (e.g. ENOSPC when fs.inotify.max_user_watches is used up)."""
+
+
+class InotifyWatcher:
+    """Watches folders with Linux inotify (called through ctypes) and reports changed paths."""
+
+    def __init__(self):
+        """Create the inotify instance; raises OSError where inotify is not available."""
+        libc_name = ctypes.util.find_library("c")
+        self.libc = ctypes.CDLL(libc_name, use_errno=True) if libc_name else None
+        if self.libc is None or not hasattr(self.libc, "inotify_init1"):
+            raise OSError(errno.ENOSYS, "inotify is not available")
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.watches = {}
+        self.folders = {}
+
+    def watch(self, owner, base_path: str, rel_dir: str):
+        """Watch one folder of owner (a snapshot rooted at base_path)."""
+        folder = os.path.join(base_path, rel_dir) if rel_dir else base_path
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(folder), WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            if error in (errno.ENOENT, errno.ENOTDIR):
+                # The folder went away after it was listed; its parent's events cover that.
+                return
+            raise WatchError(error, f"cannot watch {folder}: {os.strerror(error)}")
+        self.watches[wd] = (owner, rel_dir)
+        self.folders[(id(owner), rel_dir)] = wd
+
+    def unwatch(self, owner, rel_dir: str):
+        """Stop watching one folder of owner."""
+        wd = self.folders.pop((id(owner), rel_dir), None)
+        if wd is not None:
+            self.watches.pop(wd, None)
+            self.libc.inotify_rm_watch(self.fd, wd)
+
+    def drain(self) -> tuple[set, bool]:
+        """Read all queued events; return ({(owner, relative path)}, whether events were lost)."""
+        changed, overflow = set(), False
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return changed, overflow
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                name = data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b"\0")
+                offset += EVENT_HEADER.size + length
+                if mask & IN_Q_OVERFLOW:
+                    overflow = True
+                elif mask & IN_IGNORED:
+                    owner, rel_dir = self.watches.pop(wd, (None, None))
+                    if owner is not None and self.folders.get((id(owner), rel_dir)) == wd:
+                        del self.folders[(id(owner), rel_dir)]
+                elif name and wd in self.watches:
+                    owner, rel_dir = self.watches[wd]
+                    name = os.fsdecode(name)
+                    changed.add((owner, os.path.join(rel_dir, name) if rel_dir else name))
+
+    def close(self):
+        """Release the inotify instance."""
+        os.close(self.fd)
+
+
+class TreeSnapshot:
+    """Content hashes of the non-ignored files under one folder, updated path by path."""
+
+    def __init__(self, base_path: str, rules, index, index_prefix: str = "", watcher=None):
+        """Initialize with the folder, its ignore rules, the index and the index key prefix."""
+        self.base_path = base_path
+        self.rules = rules
+        self.index = index
+        self.index_prefix = index_prefix
+        self.watcher = watcher
+        self.files = {}
+        self.folders = set()
+
+    def _hash(self, rel_path: str, st: os.stat_result) -> str:
+        """Hash a file through the index."""
+        key = os.path.join(self.index_prefix, rel_path) if self.index_prefix else rel_path
+        return self.index.hash(key, st)
+
+    def rebuild(self):
+        """Scan the whole folder again."""
+        for rel_dir in self.folders:
+            if self.watcher:
+                self.watcher.unwatch(self, rel_dir)
+        self.files.clear()
+        self.folders.clear()
+        self._scan_tree("")
+
+    def _scan_tree(self, start: str):
+        """Add every file under a folder (and watch its subfolders)."""
+        stack = [start]
+        while stack:
+            rel_dir = stack.pop()
+            self.folders.add(rel_dir)
+            if self.watcher:
+                self.watcher.watch(self, self.base_path, rel_dir)
+            files, subdirs = scan_folder(self.base_path, rel_dir, self.rules)
+            for record in files:
+                self.files[record.rel_path] = self._hash(record.rel_path, record.stat())
+            stack.extend(subdirs)
+
+    def _forget_tree(self, rel_dir: str):
+        """Drop a folder that disappeared, with everything under it."""
+        prefix = os.path.join(rel_dir, "")
+        for folder in [f for f in self.folders if f == rel_dir or f.startswith(prefix)]:
+            self.folders.discard(folder)
+            if self.watcher:
+                self.watcher.unwatch(self, folder)
+        for rel_path in [p for p in self.files if p.startswith(prefix)]:
+            del self.files[rel_path]
+
+    def update(self, rel_path: str):
+        """Bring one path reported as changed up to date."""
+        full_path = os.path.join(self.base_path, rel_path)
+        try:
+            mode = os.lstat(full_path).st_mode
+        except FileNotFoundError:
+            mode = None
+        if mode is not None and stat.S_ISDIR(mode):
+            self.files.pop(rel_path, None)
+            if rel_path not in self.folders and not self.rules.match(rel_path, is_dir=True):
+                self._scan_tree(rel_path)
+            return
+        if rel_path in self.folders:
+            self._forget_tree(rel_path)
+        try:
+            st = os.stat(full_path)
+        except (FileNotFoundError, NotADirectoryError):
+            st = None
+        tracked_folder = os.path.dirname(rel_path) in self.folders
+        if st is not None and stat.S_ISREG(st.st_mode) and tracked_folder and not self.rules.match(rel_path):
+            self.files[rel_path] = self._hash(rel_path, st)
+        else:
+            self.files.pop(rel_path, None)
+
+
+class Daemon:
+    """Serves status, log and diff for one repository over a Unix socket, from cached state."""
+
+    def __init__(self, path):
+        """Load the repository state and start watching the working tree and staging area."""
+        self.repo = Repository(path)
+        self.path = self.repo.path
+        try:
+            self.watcher = InotifyWatcher()
+        except OSError:
+            # Without inotify every status re-stats the tree (still without reloading anything).
+            self.watcher = None
+        self.rules = self.repo.ignore_rules
+        staging_path = wit_subfolder(self.path, "staging")
+        self.working = TreeSnapshot(self.path, self.rules, self.repo.index, watcher=self.watcher)
+        self.staged = TreeSnapshot(
+            staging_path, walk_rules(staging_path, include_wit=True), self.repo.index,
+            os.path.relpath(staging_path, self.path), self.watcher
+        )
+        if self.watcher:
+            try:
+                self.working.rebuild()
+                self.staged.rebuild()
+            except WatchError as e:
+                self._stop_watching(e)
+        self.running = False
+
+    def _stop_watching(self, error: WatchError):
+        """Fall back to polling when a folder cannot be watched, since its edits would go unseen."""
+        print(f"warning: {error.strerror}; falling back to polling (every status re-stats the tree).")
+        self.watcher.close()
+        self.watcher = self.working.watcher = self.staged.watcher = None
+
+    @property
+    def mode(self) -> str:
+        """Describe how the daemon notices changes."""
+        return "inotify" if self.watcher else "polling"
+
+    def refresh(self) -> tuple[dict, dict]:
+        """Apply queued file changes; return (working-tree hashes, staged hashes)."""
+        if self.watcher is None:
+            return self.repo.scan()
+        rules = self.repo.ignore_rules
+        changed, overflow = self.watcher.drain()
+        try:
+            if overflow or rules is not self.rules:
+                self.rules = self.working.rules = rules
+                self.working.rebuild()
+                self.staged.rebuild()
+            else:
+                for snapshot, rel_path in sorted(changed, key=lambda item: item[1]):
+                    snapshot.update(rel_path)
+        except WatchError as e:
+            self._stop_watching(e)
+            return self.repo.scan()
+        return self.working.files, self.staged.files
+
+    def handle(self, request: dict) -> dict:
+        """Answer one request."""
+        command, args = request.get("command"), request.get("args") or {}
+        if command == "ping":
+            return {"output": f"wit daemon serving {self.path} ({self.mode})\n"}
+        if command == "stop":
+            self.running = False
+            return {"output": "wit daemon stopped.\n"}
+        output = io.StringIO()
+        try:
+            with redirect_stdout(output):
+                if command == "status":
+                    self.repo.print_status(self.refresh())
+                elif command == "log":
+                    for key in ("since", "until"):
+                        if args.get(key):
+                            args[key] = datetime.fromisoformat(args[key])
+                    self.repo.log(**args)
+                elif command == "diff":
+                    self.repo.diff(**args)
+                else:
+                    return {"error": f"unknown command: {command}"}
+        finally:
+            # Another process may repack objects between requests.
+            self.repo.reopen_objects()
+        return {"output": output.getvalue()}
+
+    def _serve_connection(self, conn: socket.socket):
+        """Read one JSON request line from a connection and write the JSON reply."""
+        with conn:
+            data = b""
+            while not data.endswith(b"\n"):
+                chunk = conn.recv(64 * 1024)
+                if not chunk:
+                    break
+                data += chunk
+            try:
+                reply = self.handle(json.loads(data))
+            except Exception as e:
+                reply = {"error": f"{type(e).__name__}: {e}"}
+            conn.sendall(json.dumps(reply).encode() + b"\n")
+
+    def serve(self, sock_path: str):
+        """Accept requests until stopped, keeping the watched state fresh in between."""
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(sock_path)
+        server.listen(16)
+        self.running = True
+        try:
+            while self.running:
+                ready, _, _ = select.select([server], [], [], REFRESH_SECONDS)
+                if not ready:
+                    if self.watcher:
+                        self.refresh()
+                    continue
+                conn, _ = server.accept()
+                self._serve_connection(conn)
+        finally:
+            server.close()
+            if os.path.exists(sock_path):
+                os.remove(sock_path)
+            if self.watcher:
+                self.watcher.close()
+
+
+def run_daemon(path):
+    """Run the daemon for the repository at path in the foreground."""
+    if not hasattr(socket, "AF_UNIX"):
+        print("fatal: wit daemon needs Unix domain sockets, which this platform does not provide.")
+        return
+    if not os.path.exists(wit_subfolder(path)):
+        print("fatal: not a wit repository (or any of the parent directories): .wit")
+        return
+    sock_path = socket_path(path)
+    if daemon_request(path, "ping"):
+        print("fatal: a wit daemon is already running for this repository.")
+        return
+    if os.path.exists(sock_path):
+        os.remove(sock_path)
+    daemon = Daemon(path)
+    signal.signal(signal.SIGTERM, lambda *_: setattr(daemon, "running", False))
+    print(f"wit daemon serving {daemon.path} on {sock_path} ({daemon.mode}). Press Ctrl-C to stop.")
+    try:
+        daemon.serve(sock_path)
+    except KeyboardInterrupt:
+        pass
+    except OSError as e:
+        print(f"fatal: cannot serve on {sock_path}: {e}")
+
+
+def stop_daemon(path):
+    """Ask the daemon of the repository at path to stop."""
+    reply = daemon_request(path, "stop")
+    print(reply["output"].rstrip() if reply and "output" in reply else "No wit daemon is running.")
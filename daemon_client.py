@@ -0,0 +1,48 @@
+import os, json, socket
+from file_manager import wit_subfolder
+import tracing
+
+REQUEST_TIMEOUT = 30
+SOCKET_NAME = "daemon.sock"
+
+
+def socket_path(path) -> str:
+    """Return the path of the daemon socket of a repository."""
+    return wit_subfolder(path, SOCKET_NAME)
+
+
+def daemon_request(path, command: str, **args) -> dict | None:
+    """Send one request to the repository's daemon; return its reply, or None if none is running."""
+    sock_path = socket_path(path)
+    if not hasattr(socket, "AF_UNIX") or not os.path.exists(sock_path):
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.settimeout(REQUEST_TIMEOUT)
+            client.connect(sock_path)
+            client.sendall(json.dumps({"command": command, "args": args}).encode() + b"\n")
+            data = b""
+            while not data.endswith(b"\n"):
+                chunk = client.recv(64 * 1024)
+                if not chunk:
+                    break
+                data += chunk
+        return json.loads(data)
+    except (OSError, ValueError):
+        return None
+
+
+def run_via_daemon(path, command: str, **args) -> bool:
+    """Run a read-only command through the daemon and print its output; False if that was not possible."""
+    if tracing.ENABLED:
+        # A traced command runs here, where its work can be measured.
+        return False
+    reply = daemon_request(path, command, **args)
+    if not reply:
+        return False
+    if "error" in reply:
+        # Running the command again here would hide the daemon's problem.
+        print(f"error: wit daemon: {reply['error']}")
+        return True
+    print(reply.get("output", ""), end="")
+    return True
@@ -0,0 +1,381 @@
+from object_store import ObjectStore
+from transfer import DEFAULT_JOBS
+import tracing
+
+CONTEXT_LINES = 3
+BINARY_SNIFF_SIZE = 8000
+PARALLEL_MIN_FILES = 4
+STAT_BAR_WIDTH = 40
+# Beyond this many edit steps a middle snake is not worth finding exactly; like xdiff's
+# "too expensive" heuristic, split at the furthest-reaching point and accept a longer diff.
+MAX_EDIT_COST = 256
+
+_stores = {}
+
+
+def is_binary(data: bytes) -> bool:
+    """Treat content with a NUL byte near the start as binary, like git does."""
+    return b"\0" in data[:BINARY_SNIFF_SIZE]
+
+
+def _common_prefix(a, a0, a1, b, b0, b1) -> int:
+    """Return the length of the common prefix of a[a0:a1] and b[b0:b1]."""
+    n = 0
+    while a0 + n < a1 and b0 + n < b1 and a[a0 + n] == b[b0 + n]:
+        n += 1
+    return n
+
+
+def _common_suffix(a, a0, a1, b, b0, b1) -> int:
+    """Return the length of the common suffix of a[a0:a1] and b[b0:b1]."""
+    n = 0
+    while a1 - n > a0 and b1 - n > b0 and a[a1 - n - 1] == b[b1 - n - 1]:
+        n += 1
+    return n
+
+
+def _bisect(a, a0, a1, b, b0, b1):
+    """Find the middle snake of a[a0:a1] vs b[b0:b1] (linear-space Myers).
+
+    Returns the split point (x, y) in absolute coordinates, or None if the ranges share nothing.
+    """
+    best_x = best_y = 0
+    n, m = a1 - a0, b1 - b0
+    max_d = (n + m + 1) // 2
+    offset = max_d
+    length = 2 * max_d + 2
+    forward = [-1] * length
+    backward = [-1] * length
+    forward[offset + 1] = backward[offset + 1] = 0
+    delta = n - m
+    odd = delta % 2 != 0
+    k1_start = k1_end = k2_start = k2_end = 0
+    for d in range(max_d):
+        for k1 in range(-d + k1_start, d + 1 - k1_end, 2):
+            i = offset + k1
+            if k1 == -d or (k1 != d and forward[i - 1] < forward[i + 1]):
+                x1 = forward[i + 1]
+            else:
+                x1 = forward[i - 1] + 1
+            y1 = x1 - k1
+            while x1 < n and y1 < m and a[a0 + x1] == b[b0 + y1]:
+                x1 += 1
+                y1 += 1
+            forward[i] = x1
+            if x1 + y1 > best_x + best_y and x1 <= n and y1 <= m:
+                best_x, best_y = x1, y1
+            if x1 > n:
+                k1_end += 2
+            elif y1 > m:
+                k1_start += 2
+            elif odd:
+                j = offset + delta - k1
+                if 0 <= j < length and backward[j] != -1 and x1 >= n - backward[j]:
+                    return a0 + x1, b0 + y1
+        for k2 in range(-d + k2_start, d + 1 - k2_end, 2):
+            i = offset + k2
+            if k2 == -d or (k2 != d and backward[i - 1] < backward[i + 1]):
+                x2 = backward[i + 1]
+            else:
+                x2 = backward[i - 1] + 1
+            y2 = x2 - k2
+            while x2 < n and y2 < m and a[a1 - x2 - 1] == b[b1 - y2 - 1]:
+                x2 += 1
+                y2 += 1
+            backward[i] = x2
+            if x2 > n:
+                k2_end += 2
+            elif y2 > m:
+                k2_start += 2
+            elif not odd:
+                j = offset + delta - k2
+                if 0 <= j < length and forward[j] != -1:
+                    x1 = forward[j]
+                    if x1 >= n - x2:
+                        return a0 + x1, b0 + offset + x1 - j
+        if d >= MAX_EDIT_COST:
+            return (a0 + best_x, b0 + best_y) if best_x + best_y else (a0 + n // 2, b0 + m // 2)
+    return None
+
+
+def _myers(a, a0, a1, b, b0, b1, blocks: list):
+    """Append the matching blocks (i, j, size) of a[a0:a1] vs b[b0:b1] to blocks."""
+    stack = [(a0, a1, b0, b1)]
+    while stack:
+        a0, a1, b0, b1 = stack.pop()
+        prefix = _common_prefix(a, a0, a1, b, b0, b1)
+        if prefix:
+            blocks.append((a0, b0, prefix))
+            a0 += prefix
+            b0 += prefix
+        suffix = _common_suffix(a, a0, a1, b, b0, b1)
+        if suffix:
+            blocks.append((a1 - suffix, b1 - suffix, suffix))
+            a1 -= suffix
+            b1 -= suffix
+        if a0 == a1 or b0 == b1:
+            continue
+        split = _bisect(a, a0, a1, b, b0, b1)
+        if split:
+            x, y = split
+            stack.append((a0, x, b0, y))
+            stack.append((x, a1, y, b1))
+
+
+def _unique_anchors(a, a0, a1, b, b0, b1) -> list[tuple[int, int]]:
+    """Return the longest increasing run of lines that occur exactly once on both sides."""
+    counts = {}
+    for i in range(a0, a1):
+        entry = counts.get(a[i])
+        counts[a[i]] = [i, None, 1, 0] if entry is None else [entry[0], None, entry[2] + 1, 0]
+    for j in range(b0, b1):
+        entry = counts.get(b[j])
+        if entry is not None:
+            entry[1] = j
+            entry[3] += 1
+    pairs = sorted((e[1], e[0]) for e in counts.values() if e[2] == 1 and e[3] == 1)
+    # Patience sorting: longest increasing subsequence of a-positions in b order.
+    tails, tail_ids, back = [], [], []
+    for index, (_, i) in enumerate(pairs):
+        lo, hi = 0, len(tails)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if tails[mid] < i:
+                lo = mid + 1
+            else:
+                hi = mid
+        back.append(tail_ids[lo - 1] if lo else -1)
+        if lo == len(tails):
+            tails.append(i)
+            tail_ids.append(index)
+        else:
+            tails[lo] = i
+            tail_ids[lo] = index
+    anchors = []
+    index = tail_ids[-1] if tail_ids else -1
+    while index != -1:
+        j, i = pairs[index]
+        anchors.append((i, j))
+        index = back[index]
+    anchors.reverse()
+    return anchors
+
+
+def matching_blocks(a: list, b: list) -> list[tuple[int, int, int]]:
+    """Return the sorted matching blocks (i, j, size) between two line sequences.
+
+    Uses patience diff (unique lines as anchors) and falls back to Myers between anchors.
+    """
+    blocks = []
+    stack = [(0, len(a), 0, len(b))]
+    while stack:
+        a0, a1, b0, b1 = stack.pop()
+        prefix = _common_prefix(a, a0, a1, b, b0, b1)
+        if prefix:
+            blocks.append((a0, b0, prefix))
+            a0 += prefix
+            b0 += prefix
+        suffix = _common_suffix(a, a0, a1, b, b0, b1)
+        if suffix:
+            blocks.append((a1 - suffix, b1 - suffix, suffix))
+            a1 -= suffix
+            b1 -= suffix
+        if a0 == a1 or b0 == b1:
+            continue
+        anchors = _unique_anchors(a, a0, a1, b, b0, b1)
+        if not anchors:
+            _myers(a, a0, a1, b, b0, b1, blocks)
+            continue
+        for i, j in anchors:
+            stack.append((a0, i, b0, j))
+            blocks.append((i, j, 1))
+            a0, b0 = i + 1, j + 1
+        stack.append((a0, a1, b0, b1))
+    blocks.sort()
+    merged = []
+    for i, j, size in blocks:
+        if merged and merged[-1][0] + merged[-1][2] == i and merged[-1][1] + merged[-1][2] == j:
+            merged[-1] = (merged[-1][0], merged[-1][1], merged[-1][2] + size)
+        else:
+            merged.append((i, j, size))
+    return merged
+
+
+def _to_ids(old_lines: list[bytes], new_lines: list[bytes]) -> tuple[list[int], list[int]]:
+    """Replace lines by small integers so comparisons are cheap."""
+    ids = {}
+    return ([ids.setdefault(line, len(ids)) for line in old_lines],
+             [ids.setdefault(line, len(ids)) for line in new_lines])
+
+
+def count_changes(old_lines: list[bytes], new_lines: list[bytes]) -> tuple[int, int]:
+    """Return (insertions, deletions) between two line lists without building hunks."""
+    matched = sum(size for _, _, size in matching_blocks(*_to_ids(old_lines, new_lines)))
+    return len(new_lines) - matched, len(old_lines) - matched
+
+
+def _opcodes(blocks, n: int, m: int) -> list[tuple]:
+    """Turn matching blocks into ("equal" | "change", i1, i2, j1, j2) operations."""
+    ops = []
+    i = j = 0
+    for bi, bj, size in blocks + [(n, m, 0)]:
+        if bi > i or bj > j:
+            ops.append(("change", i, bi, j, bj))
+        if size:
+            ops.append(("equal", bi, bi + size, bj, bj + size))
+        i, j = bi + size, bj + size
+    return ops
+
+
+def _grouped_opcodes(ops: list[tuple], context: int):
+    """Yield groups of operations, one per hunk, with at most `context` equal lines around changes."""
+    if not ops or ops == [ops[0]] and ops[0][0] == "equal":
+        return
+    if ops[0][0] == "equal":
+        tag, i1, i2, j1, j2 = ops[0]
+        ops[0] = (tag, max(i1, i2 - context), i2, max(j1, j2 - context), j2)
+    if ops[-1][0] == "equal":
+        tag, i1, i2, j1, j2 = ops[-1]
+        ops[-1] = (tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context))
+    group = []
+    for tag, i1, i2, j1, j2 in ops:
+        if tag == "equal" and i2 - i1 > 2 * context:
+            group.append((tag, i1, i1 + context, j1, j1 + context))
+            yield group
+            group = []
+            i1, j1 = i2 - context, j2 - context
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == "equal"):
+        yield group
+
+
+def _range(start: int, count: int) -> str:
+    """Format one side of a hunk header the way unified diffs do."""
+    if count == 1:
+        return str(start + 1)
+    return f"{start + 1 if count else start},{count}"
+
+
+def unified_hunks(old_lines: list[bytes], new_lines: list[bytes], context: int = CONTEXT_LINES):
+    """Yield the lines (bytes, without newlines) of a unified diff between two line lists."""
+    blocks = matching_blocks(*_to_ids(old_lines, new_lines))
+    ops = _opcodes(blocks, len(old_lines), len(new_lines))
+    for group in _grouped_opcodes(ops, context):
+        i1, i2, j1, j2 = group[0][1], group[-1][2], group[0][3], group[-1][4]
+        yield f"@@ -{_range(i1, i2 - i1)} +{_range(j1, j2 - j1)} @@".encode()
+        for tag, i1, i2, j1, j2 in group:
+            if tag == "equal":
+                for line in old_lines[i1:i2]:
+                    yield from _diff_line(b" ", line)
+                continue
+            for line in old_lines[i1:i2]:
+                yield from _diff_line(b"-", line)
+            for line in new_lines[j1:j2]:
+                yield from _diff_line(b"+", line)
+
+
+def _diff_line(prefix: bytes, line: bytes):
+    """Yield one diff line, plus git's marker if the file does not end with a newline."""
+    if line.endswith(b"\n"):
+        yield prefix + line[:-1]
+    else:
+        yield prefix + line
+        yield b"\\ No newline at end of file"
+
+
+def _store(repo_path: str) -> ObjectStore:
+    """Return this process's object store for a repository."""
+    store = _stores.get(repo_path)
+    if store is None:
+        store = _stores[repo_path] = ObjectStore(repo_path)
+    return store
+
+
+def close_stores():
+    """Close this process's object stores, so objects repacked since are found."""
+    for store in _stores.values():
+        store.close()
+    _stores.clear()
+
+
+def read_source(repo_path: str, source) -> bytes:
+    """Read one side of a diff: None (absent), ("file", path) or ("blob", sha)."""
+    if source is None:
+        return b""
+    kind, value = source
+    if kind == "blob":
+        return _store(repo_path).read_bytes(value)
+    with open(value, "rb") as file:
+        return file.read()
+
+
+def diff_entry(entry) -> tuple:
+    """Compare one file; entry is (repo path, relative path, old source, new source, stat only).
+
+    Returns (relative path, insertions, deletions, binary, unified diff lines or None).
+    """
+    repo_path, rel_path, old, new, stat_only = entry
+    old_data, new_data = read_source(repo_path, old), read_source(repo_path, new)
+    if is_binary(old_data) or is_binary(new_data):
+        return rel_path, 0, 0, True, None
+    old_lines, new_lines = old_data.splitlines(keepends=True), new_data.splitlines(keepends=True)
+    if stat_only:
+        return (rel_path, *count_changes(old_lines, new_lines), False, None)
+    lines = list(unified_hunks(old_lines, new_lines))
+    insertions = sum(1 for line in lines if line[:1] == b"+")
+    deletions = sum(1 for line in lines if line[:1] == b"-")
+    return rel_path, insertions, deletions, False, lines
+
+
+def diff_entries(entries: list, jobs: int | None = None):
+    """Diff files on a process pool (the work is CPU-bound) and yield results in order."""
+    jobs = jobs or DEFAULT_JOBS
+    tracing.count("files diffed", len(entries))
+    if jobs <= 1 or len(entries) < PARALLEL_MIN_FILES:
+        yield from map(diff_entry, entries)
+        return
+    # Loaded on demand: the process pool pulls in multiprocessing, which most commands never need.
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=min(jobs, len(entries))) as pool:
+        yield from pool.map(diff_entry, entries, chunksize=max(1, len(entries) // (jobs * 4)))
+
+
+def format_stat(results: list[tuple]) -> list[str]:
+    """Return git-style --stat lines for (path, insertions, deletions, binary, _) results."""
+    if not results:
+        return []
+    name_width = max(len(r[0]) for r in results)
+    most = max(r[1] + r[2] for r in results) or 1
+    count_width = len(str(most))
+    scale = min(1.0, STAT_BAR_WIDTH / most)
+    lines = []
+    for rel_path, insertions, deletions, binary, _ in results:
+        if binary:
+            lines.append(f" {rel_path.ljust(name_width)} | {'Bin'.rjust(count_width)}")
+            continue
+        plus = "+" * max(int(insertions * scale), 1 if insertions else 0)
+        minus = "-" * max(int(deletions * scale), 1 if deletions else 0)
+        total = str(insertions + deletions).rjust(count_width)
+        lines.append(f" {rel_path.ljust(name_width)} | {total} {plus}{minus}".rstrip())
+    insertions = sum(r[1] for r in results)
+    deletions = sum(r[2] for r in results)
+    lines.append(f" {len(results)} file(s) changed, {insertions} insertions(+), {deletions} deletions(-)")
+    return lines
+
+
+def file_header(rel_path: str, old, new) -> list[str]:
+    """Return the header lines that introduce one file in a unified diff."""
+    lines = [f"diff --wit a/{rel_path} b/{rel_path}"]
+    if old is None:
+        lines.append("new file")
+    elif new is None:
+        lines.append("deleted file")
+    return lines
+
+
+def patch_paths(rel_path: str, old, new) -> list[str]:
+    """Return the ---/+++ lines of one file in a unified diff."""
+    return [
+        f"--- {'/dev/null' if old is None else 'a/' + rel_path}",
+        f"+++ {'/dev/null' if new is None else 'b/' + rel_path}",
+    ]
@@ -1,22 +1,9 @@
 import os, shutil, subprocess
+import tracing
 
-IGNORED_FILES = {"desktop.ini", "Thumbs.db", "ehthumbs.db", ".DS_Store"}
-IGNORED_FOLDERS = {".git", ".wit", ""}
-IGNORED_PREFIXES = {"~$"}
-IGNORED_EXTENSIONS = {".tmp", ".lnk"}
-
-def should_ignore(path_or_name: str, *, allow_wit=False, allow_results=True) -> bool:
-    name = os.path.basename(path_or_name).lower()
-    path = path_or_name.lower()
-    if not allow_wit and any(part in IGNORED_FOLDERS for part in path.split(os.sep)):
-        return True
-    if not allow_results and "results" in path.split(os.sep):
-        return True
-    return (
-        name in IGNORED_FILES or
-        any(name.startswith(prefix) for prefix in IGNORED_PREFIXES) or
-        any(name.endswith(ext) for ext in IGNORED_EXTENSIONS)
-    )
+from ignore_rules import (
+    IGNORED_FILES, IGNORED_FOLDERS, IGNORED_PREFIXES, IGNORED_EXTENSIONS, get_ignore_rules
+)
 
 def is_valid_path(path: str) -> bool:
     return os.path.exists(path)
@@ -31,11 +18,6 @@ def create_new_folder_in_path(path: str):
     except Exception:
         pass
 
-def copy_file(source_path: str, dest_path: str):
-    if is_valid_path(source_path):
-        ensure_parent_exists(dest_path)
-        shutil.copy2(source_path, dest_path)
-
 def delete_file(path: str):
     if is_valid_path(path):
         os.remove(path)
@@ -43,25 +25,67 @@ def delete_file(path: str):
 def is_empty_folder(path: str) -> bool:
     return not os.listdir(path)
 
+class FileRecord:
+    """A file found by walk_files; stat data comes from its os.DirEntry and is cached."""
+    __slots__ = ("base_path", "rel_path", "entry")
+
+    def __init__(self, base_path: str, rel_path: str, entry: os.DirEntry):
+        self.base_path = base_path
+        self.rel_path = rel_path
+        self.entry = entry
+
+    @property
+    def path(self) -> str:
+        return self.entry.path
+
+    def stat(self) -> os.stat_result:
+        return self.entry.stat()
+
+def walk_rules(base_path: str, *, include_wit=False, include_graphs=True):
+    """Return the ignore rules walk_files applies under base_path with the given options."""
+    return get_ignore_rules(
+        None if include_wit else base_path, allow_wit=include_wit, allow_results=include_graphs
+    )
+
+def scan_folder(base_path: str, rel_dir: str, rules) -> tuple[list, list[str]]:
+    """List one folder: FileRecords of its non-ignored files and the paths of its non-ignored subfolders."""
+    files, subdirs = [], []
+    try:
+        entries = os.scandir(os.path.join(base_path, rel_dir) if rel_dir else base_path)
+    except (FileNotFoundError, NotADirectoryError, PermissionError):
+        return files, subdirs
+    with entries:
+        for entry in entries:
+            rel_path = os.path.join(rel_dir, entry.name) if rel_dir else entry.name
+            if entry.is_dir(follow_symlinks=False):
+                if not rules.match(rel_path, is_dir=True):
+                    subdirs.append(rel_path)
+            elif entry.is_file() and not rules.match(rel_path):
+                files.append(FileRecord(base_path, rel_path, entry))
+    tracing.count("folders walked")
+    tracing.count("files walked", len(files))
+    return files, subdirs
+
+def walk_files(base_path: str, *, include_wit=False, include_graphs=True, rules=None, start=""):
+    """Yield a FileRecord per non-ignored file under base_path (or its `start` subfolder), lazily."""
+    if rules is None:
+        rules = walk_rules(base_path, include_wit=include_wit, include_graphs=include_graphs)
+    stack = [start]
+    while stack:
+        files, subdirs = scan_folder(base_path, stack.pop(), rules)
+        yield from files
+        stack.extend(reversed(subdirs))
+
+def walk_roots(roots):
+    """Yield FileRecords from several (base_path, walk_files options) roots in one pass."""
+    for base_path, options in roots:
+        yield from walk_files(base_path, **options)
+
 def list_all_files_recursively(base_path: str, *, include_wit=False, include_graphs=True):
-    all_files = []
-    for root, dirs, files in os.walk(base_path):
-        if not include_wit and ".wit" in root.split(os.sep):
-            continue
-        if not include_graphs and "results" in root.split(os.sep):
-            continue
-        dirs[:] = [d for d in dirs if not should_ignore(os.path.join(root, d))]
-        for file in files:
-            file_path = os.path.join(root, file)
-            rel_path = os.path.relpath(file_path, base_path)
-            if not include_wit and ".wit" in rel_path.split(os.sep):
-                continue
-            if not include_graphs and "results" in rel_path.split(os.sep):
-                continue
-            if should_ignore(file_path, allow_wit=include_wit, allow_results=include_graphs):
-                continue
-            all_files.append(rel_path)
-    return all_files
+    return [
+        record.rel_path
+        for record in walk_files(base_path, include_wit=include_wit, include_graphs=include_graphs)
+    ]
 
 def delete_empty_folders(path: str):
     for root, dirs, _ in os.walk(path, topdown=False):
@@ -70,15 +94,6 @@ def delete_empty_folders(path: str):
             if is_empty_folder(dir_path):
                 os.rmdir(dir_path)
 
-def _clear_working_directory(path: str, valid_files: set):
-    working_files = list_all_files_recursively(path, include_wit=False)
-    for rel_path in working_files:
-        if rel_path in valid_files:
-            continue
-        full_path = os.path.join(path, rel_path)
-        if os.path.isfile(full_path):
-            delete_file(full_path)
-
 def clear_all_file_and_directory(path: str):
     if not os.path.isdir(path):
         print(f"Path '{path}' is not a valid directory.")
@@ -0,0 +1,107 @@
+import os, json, hashlib
+from file_manager import wit_subfolder
+from object_store import ObjectStore
+from hasher import hash_file, CHUNK_SIZE
+from transfer import map_parallel
+
+
+def find_temp_files(path: str) -> list[str]:
+    """Return temporary files left in .wit by interrupted writes."""
+    wit_path = wit_subfolder(path)
+    found = []
+    for root, folders, files in os.walk(wit_path):
+        if os.path.relpath(root, wit_path).split(os.sep)[0] == "staging":
+            folders.clear()
+            continue
+        for name in files:
+            if root == wit_path and name.startswith(("index.tmp", "push_state.tmp")):
+                # Written by commands that do not take the lock (status, push, analyze); may be in use.
+                continue
+            if ".tmp" in name or name.endswith(".lock") or (name.startswith("tmp-") and name.endswith(".pack")):
+                found.append(os.path.join(root, name))
+    return sorted(found)
+
+
+def _loose_object_ok(store: ObjectStore, sha: str) -> bool:
+    """Check that a loose object's content still matches its hash."""
+    try:
+        return hash_file(store.object_path(sha)) == sha
+    except OSError:
+        return False
+
+
+def _packed_object_ok(store: ObjectStore, sha: str) -> bool:
+    """Check that a packed object (and its delta chain) decodes to content matching its hash."""
+    try:
+        return hashlib.sha1(store.read_bytes(sha)).hexdigest() == sha
+    except Exception:
+        return False
+
+
+def _chunked_object_ok(store: ObjectStore, sha: str) -> bool:
+    """Check that a chunked object's chunks exist and reassemble to content matching its hash."""
+    try:
+        whole = hashlib.sha1()
+        with store.open_blob(sha) as file:
+            for chunk in iter(lambda: file.read(CHUNK_SIZE), b""):
+                whole.update(chunk)
+        return whole.hexdigest() == sha
+    except Exception:
+        return False
+
+
+def check_objects(store: ObjectStore, jobs: int | None = None) -> tuple[list[str], list[str]]:
+    """Re-hash every stored object.
+
+    Returns (corrupt loose and chunked objects, corrupt packed objects); the first
+    kind can be restored from a working-tree file with the same content.
+    """
+    loose = list(store.loose_objects())
+    loose_ok = map_parallel(lambda sha: _loose_object_ok(store, sha), loose, jobs)
+    corrupt_loose = [sha for sha, ok in zip(loose, loose_ok) if not ok]
+    chunked = list(store.chunked_objects())
+    chunked_ok = map_parallel(lambda sha: _chunked_object_ok(store, sha), chunked, jobs)
+    corrupt_loose += [sha for sha, ok in zip(chunked, chunked_ok) if not ok]
+    bad = set(corrupt_loose)
+    packed = sorted({sha for pack in store.packs for sha in pack.shas()} - set(loose))
+    corrupt_packed = [sha for sha in packed if sha not in bad and not _packed_object_ok(store, sha)]
+    return corrupt_loose, corrupt_packed
+
+
+def check_commits(commits: list, store: ObjectStore) -> list[tuple[str, str, str | None]]:
+    """Check that every commit's parent, tree and blobs exist.
+
+    Returns problems as (commit hash, kind, detail) with kind one of
+    "parent", "tree" and "blob" (detail is the missing path for blobs).
+    """
+    known = {commit.hash_code for commit in commits}
+    checked = {}
+    problems = []
+    for commit in commits:
+        if commit.parent and commit.parent not in known:
+            problems.append((commit.hash_code, "parent", commit.parent))
+        if not commit.tree:
+            continue
+        try:
+            tree = store.read_tree(commit.tree)
+        except (FileNotFoundError, ValueError):
+            problems.append((commit.hash_code, "tree", commit.tree))
+            continue
+        for rel_path, sha in tree.items():
+            if sha not in checked:
+                checked[sha] = store.has(sha)
+            if not checked[sha]:
+                problems.append((commit.hash_code, "blob", rel_path))
+    return problems
+
+
+def index_is_readable(path: str) -> bool:
+    """Check that .wit/index (a cache that can be rebuilt) parses."""
+    try:
+        with open(wit_subfolder(path, "index"), "r") as file:
+            json.load(file)
+    except FileNotFoundError:
+        return True
+    except ValueError:
+        return False
+    return True
@@ -0,0 +1,26 @@
+import hashlib
+from transfer import map_parallel
+
+CHUNK_SIZE = 1024 * 1024
+# Below this many bytes in a batch, starting threads costs more than it saves.
+PARALLEL_MIN_BYTES = 4 * 1024 * 1024
+
+
+def hash_file(file_path: str) -> str:
+    """Return the SHA-1 of a file's content, read in fixed-size chunks."""
+    sha = hashlib.sha1()
+    with open(file_path, "rb", buffering=0) as file:
+        for chunk in iter(lambda: file.read(CHUNK_SIZE), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def hash_files(file_paths: list[str], sizes: list[int] | None = None, jobs: int | None = None) -> list[str]:
+    """Hash several files and return their hashes in order.
+
+    Large batches are spread over a thread pool: hashlib releases the GIL while it
+    hashes a chunk, so threads hash in parallel without the cost of worker processes.
+    """
+    if sizes is not None and sum(sizes) < PARALLEL_MIN_BYTES:
+        jobs = 1
+    return map_parallel(hash_file, file_paths, jobs)
@@ -0,0 +1,129 @@
+import os, re
+
+IGNORED_FILES = {"desktop.ini", "Thumbs.db", "ehthumbs.db", ".DS_Store"}
+IGNORED_FOLDERS = {".git", ".wit", ""}
+IGNORED_PREFIXES = {"~$"}
+IGNORED_EXTENSIONS = {".tmp", ".lnk"}
+RESULTS_FOLDER = "results"
+IGNORE_FILE_NAME = ".witignore"
+
+DEFAULT_PATTERNS = [
+    *IGNORED_FILES,
+    *(f"{prefix}*" for prefix in IGNORED_PREFIXES),
+    *(f"*{ext}" for ext in IGNORED_EXTENSIONS),
+]
+
+_cache = {}
+
+
+def _glob_to_regex(glob: str) -> str:
+    """Translate a gitignore-style glob (*, ?, **, [...]) to a regex fragment."""
+    out = []
+    i = 0
+    while i < len(glob):
+        if glob.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+        elif glob.startswith("**", i):
+            out.append(".*")
+            i += 2
+        elif glob[i] == "*":
+            out.append("[^/]*")
+            i += 1
+        elif glob[i] == "?":
+            out.append("[^/]")
+            i += 1
+        elif glob[i] == "[" and "]" in glob[i + 2:]:
+            end = glob.index("]", i + 2)
+            body = glob[i + 1:end]
+            out.append("[" + ("^" + body[1:] if body[0] == "!" else body).replace("\\", "\\\\") + "]")
+            i = end + 1
+        elif glob[i] == "\\" and i + 1 < len(glob):
+            out.append(re.escape(glob[i + 1]))
+            i += 2
+        else:
+            out.append(re.escape(glob[i]))
+            i += 1
+    return "".join(out)
+
+
+def parse_pattern(line: str, ignore_case: bool = False) -> tuple[str, str, bool] | None:
+    """Compile one ignore line to (file regex, folder regex, negated), or None for blanks/comments."""
+    line = line.rstrip("\r\n").rstrip(" ")
+    if not line or line.startswith("#"):
+        return None
+    negate = line.startswith("!")
+    if negate:
+        line = line[1:]
+    dir_only = line.endswith("/")
+    line = line.rstrip("/")
+    anchored = "/" in line
+    body = ("" if anchored else "(?:.*/)?") + _glob_to_regex(line.lstrip("/"))
+    if ignore_case:
+        body = f"(?i:{body})"
+    # A path is also ignored when one of its parent folders matches.
+    file_regex = body + ("/.+" if dir_only else "(?:/.+)?")
+    folder_regex = body + "(?:/.+)?"
+    return file_regex, folder_regex, negate
+
+
+def _combine(parts: list[str]) -> re.Pattern | None:
+    """Join regex fragments into one anchored alternation."""
+    return re.compile("^(?:" + "|".join(parts) + ")$") if parts else None
+
+
+class IgnoreRules:
+    """Ignore patterns compiled once into a single regex for files and one for folders.
+
+    Negated patterns (`!pattern`) re-include paths matched by other patterns,
+    except inside folders that are ignored as a whole.
+    """
+
+    def __init__(self, patterns: list[str], default_patterns: list[str] = ()):
+        """Compile user patterns (case-sensitive) and built-in patterns (case-insensitive)."""
+        parsed = [parse_pattern(p, ignore_case=True) for p in default_patterns]
+        parsed += [parse_pattern(p) for p in patterns]
+        parsed = [p for p in parsed if p]
+        self._file = _combine([f for f, _, neg in parsed if not neg])
+        self._folder = _combine([d for _, d, neg in parsed if not neg])
+        self._file_negated = _combine([f for f, _, neg in parsed if neg])
+        self._folder_negated = _combine([d for _, d, neg in parsed if neg])
+
+    def match(self, rel_path: str, is_dir: bool = False) -> bool:
+        """Check if a path relative to the repository root is ignored."""
+        if os.sep != "/":
+            rel_path = rel_path.replace(os.sep, "/")
+        regex, negated = (self._folder, self._folder_negated) if is_dir else (self._file, self._file_negated)
+        if regex is None or not regex.match(rel_path):
+            return False
+        return negated is None or not negated.match(rel_path)
+
+
+def read_ignore_file(repo_path: str) -> list[str]:
+    """Return the lines of the repository's .witignore, or an empty list."""
+    try:
+        with open(os.path.join(repo_path, IGNORE_FILE_NAME), "r", encoding="utf-8") as file:
+            return file.readlines()
+    except FileNotFoundError:
+        return []
+
+
+def get_ignore_rules(repo_path: str | None = None, *, allow_wit=False, allow_results=True) -> IgnoreRules:
+    """Return compiled rules for a repository, cached until its .witignore changes."""
+    defaults = list(DEFAULT_PATTERNS)
+    if not allow_wit:
+        defaults += [folder for folder in IGNORED_FOLDERS if folder]
+    if not allow_results:
+        defaults.append(RESULTS_FOLDER)
+    key = (os.path.abspath(repo_path) if repo_path else None, allow_wit, allow_results)
+    try:
+        mtime = os.stat(os.path.join(repo_path, IGNORE_FILE_NAME)).st_mtime_ns if repo_path else None
+    except FileNotFoundError:
+        mtime = None
+    cached = _cache.get(key)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    patterns = read_ignore_file(repo_path) if mtime is not None else []
+    rules = IgnoreRules(patterns, defaults)
+    _cache[key] = (mtime, rules)
+    return rules
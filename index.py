@@ -0,0 +1,104 @@
+import os, json, time, threading
+from file_manager import wit_subfolder
+from hasher import hash_files
+import tracing
+
+# A file modified this close to when it was hashed may change again without its size or
+# mtime changing (timestamps are coarse on many file systems), so its hash is not trusted.
+RACY_NS = 2 * 10 ** 9
+
+
+class Index:
+    """Persistent hash cache (.wit/index) mapping file paths to their content hashes.
+
+    An entry is [size, mtime_ns, inode, hash] and is reused while the file's stat data
+    still matches. Every command that compares content (add, status, diff, checkout,
+    commit, analyze, the daemon) goes through it, so a file is hashed once per change.
+    """
+
+    def __init__(self, path: str):
+        """Initialize with repository path and load the stored entries."""
+        self.path = path
+        self.index_path = wit_subfolder(path, "index")
+        self.entries = self._load()
+        self.seen = set()
+        self.dirty = False
+
+    def _load(self) -> dict[str, list]:
+        """Read the index file, or start empty if it is missing or unreadable."""
+        try:
+            with open(self.index_path, "r") as file:
+                return json.load(file)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    @staticmethod
+    def _stat_key(st: os.stat_result) -> list:
+        """Return the stat fields used to decide whether a file changed."""
+        # os.DirEntry.stat() reports st_ino as 0 on Windows, so inodes are only compared elsewhere.
+        return [st.st_size, st.st_mtime_ns, st.st_ino if os.name != "nt" else 0]
+
+    @staticmethod
+    def _entry(key: list, sha: str, hashed_at: int) -> list:
+        """Build an entry; a trailing "racy" marks one to re-hash on the next lookup."""
+        return key + [sha] + (["racy"] if key[1] > hashed_at - RACY_NS else [])
+
+    def hash(self, rel_path: str, st: os.stat_result | None = None) -> str:
+        """Return the content hash of a file, re-hashing only if its stat data changed."""
+        return self.hash_many({rel_path: st})[rel_path]
+
+    def hash_many(self, files: dict, jobs: int | None = None) -> dict[str, str]:
+        """Return content hashes for files (path -> stat data or None), hashing the misses in parallel."""
+        hashes = {}
+        misses = []
+        for rel_path, st in files.items():
+            key = self._stat_key(st or os.stat(os.path.join(self.path, rel_path)))
+            self.seen.add(rel_path)
+            entry = self.entries.get(rel_path)
+            if entry and entry[:3] == key and len(entry) == 4:
+                hashes[rel_path] = entry[3]
+            else:
+                misses.append((rel_path, key))
+        tracing.count("hash cache hits", len(hashes))
+        if not misses:
+            return hashes
+        tracing.count("hash cache misses", len(misses))
+        tracing.count("bytes hashed", sum(key[0] for _, key in misses))
+        hashed_at = time.time_ns()
+        with tracing.span("hash files"):
+            shas = hash_files([os.path.join(self.path, p) for p, _ in misses], [key[0] for _, key in misses], jobs)
+        for (rel_path, key), sha in zip(misses, shas):
+            self.entries[rel_path] = self._entry(key, sha, hashed_at)
+            hashes[rel_path] = sha
+        self.dirty = True
+        return hashes
+
+    def record(self, rel_path: str, sha: str):
+        """Record a file whose content hash is already known (e.g. just written)."""
+        st = os.stat(os.path.join(self.path, rel_path))
+        self.entries[rel_path] = self._entry(self._stat_key(st), sha, time.time_ns())
+        self.seen.add(rel_path)
+        self.dirty = True
+
+    def forget(self, rel_path: str):
+        """Drop a file from the index."""
+        if self.entries.pop(rel_path, None) is not None:
+            self.dirty = True
+
+    def prune(self):
+        """Drop entries for files not looked up since the index was loaded."""
+        stale = set(self.entries) - self.seen
+        for rel_path in stale:
+            del self.entries[rel_path]
+        self.dirty = self.dirty or bool(stale)
+
+    def save(self):
+        """Write the index back to disk if it changed."""
+        if not self.dirty:
+            return
+        # Status and analyze save without the repository lock, so each writer needs its own temp file.
+        tmp = f"{self.index_path}.tmp{os.getpid()}.{threading.get_ident()}"
+        with open(tmp, "w") as file:
+            json.dump(self.entries, file, separators=(",", ":"))
+        os.replace(tmp, self.index_path)
+        self.dirty = False
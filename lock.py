@@ -0,0 +1,122 @@
+import os, time, socket
+from file_manager import wit_subfolder
+import tracing
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+LOCK_TIMEOUT = float(os.environ.get("WIT_LOCK_TIMEOUT", 120))
+RETRY_DELAY = 0.01
+MAX_RETRY_DELAY = 0.5
+
+
+class LockError(Exception):
+    """Raised when the repository lock cannot be taken in time."""
+
+
+def _process_alive(pid: int) -> bool:
+    """Check if a process with the given pid exists on this machine."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class RepoLock:
+    """Exclusive lock on a repository (.wit/lock), held while a command changes it.
+
+    The lock file is created with O_EXCL and records the owner's pid and host, so a
+    lock left behind by a process that died is detected and broken.
+    """
+
+    def __init__(self, path: str, timeout: float = LOCK_TIMEOUT):
+        """Initialize with repository path and how long to wait for another process."""
+        self.path = path
+        self.lock_path = wit_subfolder(path, "lock")
+        self.timeout = timeout
+        self.held = False
+
+    def owner(self) -> tuple[int, str] | None:
+        """Return the (pid, host) recorded in the lock file, or None if unknown."""
+        try:
+            with open(self.lock_path, "r") as file:
+                pid, host = file.read().split()
+            return int(pid), host
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def is_stale(self) -> bool:
+        """Check if the lock belongs to a process on this host that no longer runs."""
+        owner = self.owner()
+        if owner is None or os.name == "nt":
+            # os.kill cannot probe a process on Windows without terminating it.
+            return False
+        pid, host = owner
+        return host == socket.gethostname() and not _process_alive(pid)
+
+    def break_stale(self) -> bool:
+        """Remove the lock file if it is stale; return whether it was removed.
+
+        Processes breaking the lock take turns through an flock on the .wit folder, so
+        one that saw the stale lock late cannot remove the lock another just took.
+        """
+        if fcntl is None or not self.is_stale():
+            return False
+        fd = os.open(os.path.dirname(self.lock_path), os.O_RDONLY)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            if not self.is_stale():
+                return False
+            try:
+                os.remove(self.lock_path)
+            except FileNotFoundError:
+                pass
+            return True
+        finally:
+            os.close(fd)
+
+    def acquire(self):
+        """Take the lock, waiting (with backoff) while another process holds it."""
+        deadline = time.monotonic() + self.timeout
+        delay = RETRY_DELAY
+        while True:
+            try:
+                fd = os.open(self.lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+            except FileExistsError:
+                if self.break_stale():
+                    continue
+                if time.monotonic() >= deadline:
+                    owner = self.owner()
+                    holder = f" (held by pid {owner[0]} on {owner[1]})" if owner else ""
+                    raise LockError(
+                        f"Unable to lock '{self.lock_path}'{holder}: another wit process is running. "
+                        "If none is, remove the file or run 'wit fsck --repair'."
+                    )
+                tracing.count("lock waits")
+                with tracing.span("wait for lock"):
+                    time.sleep(delay)
+                delay = min(delay * 2, MAX_RETRY_DELAY)
+                continue
+            with os.fdopen(fd, "w") as file:
+                file.write(f"{os.getpid()} {socket.gethostname()}\n")
+            self.held = True
+            return
+
+    def release(self):
+        """Give the lock up."""
+        if self.held:
+            self.held = False
+            os.remove(self.lock_path)
+
+    def __enter__(self):
+        """Take the lock for a with block."""
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        """Release the lock at the end of a with block, even on error."""
+        self.release()
@@ -0,0 +1,328 @@
+import os, io, json, shutil, hashlib, threading
+from file_manager import wit_subfolder, ensure_parent_exists, list_all_files_recursively
+from transfer import (
+    copy_fast, copy_files, link_or_copy, make_read_only, map_parallel, make_parent_folders, fsync_file, fsync_folder
+)
+from pack import PackReader, write_pack, plan_deltas
+from hasher import hash_file
+from chunking import LARGE_FILE_THRESHOLD, iter_chunks, ChunkedReader
+import tracing
+
+CHUNK_BUFFER = 1024 * 1024
+
+
+class ObjectStore:
+    """Content-addressed blob storage under .wit/objects; commit trees are stored as blobs too.
+
+    Files of LARGE_FILE_THRESHOLD bytes or more are stored as content-defined chunks (each
+    an ordinary blob, so identical chunks are kept once) plus a list of those chunks in
+    .wit/objects/chunked/<hash>. Readers see the same content either way.
+    """
+
+    def __init__(self, path: str):
+        """Initialize with repository path."""
+        self.path = path
+        self.objects_path = wit_subfolder(path, "objects")
+        self.committed_path = wit_subfolder(path, "committed")
+        self.pack_path = os.path.join(self.objects_path, "pack")
+        self.chunked_path = os.path.join(self.objects_path, "chunked")
+        self._packs = None
+
+    @property
+    def packs(self) -> list[PackReader]:
+        """Return readers for all pack files, opened on first use."""
+        if self._packs is None:
+            names = os.listdir(self.pack_path) if os.path.isdir(self.pack_path) else []
+            self._packs = [
+                PackReader(os.path.join(self.pack_path, name))
+                for name in sorted(names) if name.startswith("pack-") and name.endswith(".pack")
+            ]
+        return self._packs
+
+    def close(self):
+        """Close any open pack files."""
+        for pack in self._packs or []:
+            pack.close()
+        self._packs = None
+
+    def object_path(self, sha: str) -> str:
+        """Return the loose object path for a content hash."""
+        return os.path.join(self.objects_path, sha[:2], sha[2:])
+
+    def is_loose(self, sha: str) -> bool:
+        """Check if a blob is stored as a loose (uncompressed) object."""
+        return os.path.exists(self.object_path(sha))
+
+    def manifest_path(self, sha: str) -> str:
+        """Return the path of a chunked object's chunk list."""
+        return os.path.join(self.chunked_path, sha)
+
+    def is_chunked(self, sha: str) -> bool:
+        """Check if a blob is stored as a list of chunks."""
+        return os.path.exists(self.manifest_path(sha))
+
+    def has(self, sha: str) -> bool:
+        """Check if a blob with the given hash is stored, loose, chunked or packed."""
+        return self.is_loose(sha) or self.is_chunked(sha) or any(pack.find(sha) is not None for pack in self.packs)
+
+    def read_manifest(self, sha: str) -> dict:
+        """Return a chunked object's {"size": total bytes, "chunks": [[chunk hash, size], ...]}."""
+        with open(self.manifest_path(sha), "r") as file:
+            return json.load(file)
+
+    def chunked_objects(self):
+        """Yield the hashes of all chunked objects."""
+        if os.path.isdir(self.chunked_path):
+            for entry in os.scandir(self.chunked_path):
+                if ".tmp" not in entry.name:
+                    yield entry.name
+
+    def loose_objects(self):
+        """Yield the hashes of all loose objects."""
+        if not os.path.isdir(self.objects_path):
+            return
+        for folder in os.scandir(self.objects_path):
+            if not folder.is_dir() or len(folder.name) != 2:
+                continue
+            for entry in os.scandir(folder.path):
+                if ".tmp" not in entry.name:
+                    yield folder.name + entry.name
+
+    def store_file(self, file_path: str, sha: str | None = None, durable: bool = False, link: bool = False) -> str:
+        """Store a file's content as a blob (once per content) and return its hash.
+
+        The blob is written to a temporary file and renamed into place, so readers never
+        see a partial object. With durable, the content is fsynced before the rename.
+        With link, the blob is a hard link to file_path instead of a copy; only for files
+        wit owns and deletes afterwards (staged files), never for working-tree files.
+        Blobs are made read-only, so writing through another link fails instead of
+        changing history.
+        """
+        sha = sha or hash_file(file_path)
+        dest = self.object_path(sha)
+        if self.has(sha):
+            return sha
+        tracing.count("objects written")
+        if os.path.getsize(file_path) >= LARGE_FILE_THRESHOLD:
+            self._store_chunked(file_path, sha, durable)
+        else:
+            ensure_parent_exists(dest)
+            tmp = f"{dest}.tmp{os.getpid()}.{threading.get_ident()}"
+            (link_or_copy if link else copy_fast)(file_path, tmp)
+            if durable:
+                fsync_file(tmp)
+            make_read_only(tmp)
+            os.replace(tmp, dest)
+        return sha
+
+    def _store_chunked(self, file_path: str, sha: str, durable: bool = False):
+        """Store a large file as deduplicated chunks plus their list; only new chunks are written."""
+        with tracing.span("chunk large file"):
+            chunks = [[self.store_bytes(chunk, durable), len(chunk)] for chunk in iter_chunks(file_path)]
+        tracing.count("chunks", len(chunks))
+        if len(chunks) == 1:
+            # A single chunk is the whole file, already stored as an ordinary blob.
+            return
+        manifest = {"size": sum(size for _, size in chunks), "chunks": chunks}
+        os.makedirs(self.chunked_path, exist_ok=True)
+        dest = self.manifest_path(sha)
+        tmp = f"{dest}.tmp{os.getpid()}.{threading.get_ident()}"
+        with open(tmp, "w") as file:
+            json.dump(manifest, file)
+            if durable:
+                file.flush()
+                os.fsync(file.fileno())
+        os.replace(tmp, dest)
+
+    def discard(self, sha: str):
+        """Remove a loose or chunked object (its chunks stay; they may be shared)."""
+        for object_path in (self.object_path(sha), self.manifest_path(sha)):
+            if os.path.exists(object_path):
+                os.remove(object_path)
+
+    def store_bytes(self, data: bytes, durable: bool = False) -> str:
+        """Store in-memory content as a blob (once per content) and return its hash."""
+        sha = hashlib.sha1(data).hexdigest()
+        dest = self.object_path(sha)
+        if not self.has(sha):
+            tracing.count("objects written")
+            ensure_parent_exists(dest)
+            tmp = f"{dest}.tmp{os.getpid()}.{threading.get_ident()}"
+            with open(tmp, "wb") as file:
+                file.write(data)
+                if durable:
+                    file.flush()
+                    os.fsync(file.fileno())
+            make_read_only(tmp)
+            os.replace(tmp, dest)
+        return sha
+
+    def store_files(self, file_paths: list[str], jobs: int | None = None, durable: bool = False,
+                    shas: list[str] | None = None, link: bool = False) -> list[str]:
+        """Store several files concurrently and return their hashes in order.
+
+        Pass shas when the hashes are already known (e.g. from the index) to skip re-hashing.
+        """
+        items = list(zip(file_paths, shas or [None] * len(file_paths)))
+        with tracing.span("store objects"):
+            return map_parallel(lambda item: self.store_file(*item, durable=durable, link=link), items, jobs)
+
+    def sync_objects(self, shas):
+        """Flush the folders holding the given loose objects, making their renames durable."""
+        shas = list(shas)
+        for sha in [sha for sha in shas if self.is_chunked(sha)]:
+            shas += [chunk for chunk, _ in self.read_manifest(sha)["chunks"]]
+        folders = {os.path.dirname(self.object_path(sha)) for sha in shas if self.is_loose(sha)}
+        if any(self.is_chunked(sha) for sha in shas):
+            folders.add(self.chunked_path)
+        for folder in sorted(folders) + [self.objects_path]:
+            fsync_folder(folder)
+
+    def read_bytes(self, sha: str) -> bytes:
+        """Return the content of a stored blob, from a loose object or a pack."""
+        try:
+            with open(self.object_path(sha), "rb") as file:
+                return file.read()
+        except FileNotFoundError:
+            pass
+        if self.is_chunked(sha):
+            return b"".join(self.read_bytes(chunk) for chunk, _ in self.read_manifest(sha)["chunks"])
+        for pack in self.packs:
+            content = pack.read(sha, self.read_bytes)
+            if content is not None:
+                return content
+        raise FileNotFoundError(f"object {sha} not found")
+
+    def open_blob(self, sha: str):
+        """Open a stored blob for reading as a binary file object."""
+        if self.is_loose(sha):
+            return open(self.object_path(sha), "rb")
+        if self.is_chunked(sha):
+            chunks = [chunk for chunk, _ in self.read_manifest(sha)["chunks"]]
+            return io.BufferedReader(ChunkedReader(self.open_blob, chunks), CHUNK_BUFFER)
+        return io.BytesIO(self.read_bytes(sha))
+
+    def blob_size(self, sha: str) -> int:
+        """Return the size in bytes of a stored blob."""
+        if self.is_loose(sha):
+            return os.path.getsize(self.object_path(sha))
+        if self.is_chunked(sha):
+            return self.read_manifest(sha)["size"]
+        return len(self.read_bytes(sha))
+
+    def _write_blob(self, sha: str, dest_path: str):
+        """Write a packed blob, or reassemble a chunked one chunk by chunk, at a path."""
+        with open(dest_path, "wb") as file:
+            if self.is_chunked(sha):
+                with self.open_blob(sha) as source:
+                    shutil.copyfileobj(source, file, CHUNK_BUFFER)
+            else:
+                file.write(self.read_bytes(sha))
+
+    def checkout_file(self, sha: str, dest_path: str):
+        """Write a stored blob to a path in the working tree."""
+        ensure_parent_exists(dest_path)
+        if self.is_loose(sha):
+            copy_fast(self.object_path(sha), dest_path, writable=True)
+        else:
+            self._write_blob(sha, dest_path)
+
+    def checkout_files(self, files: dict[str, str], jobs: int | None = None) -> int:
+        """Write several blobs (destination path -> hash) concurrently."""
+        loose = {dest: sha for dest, sha in files.items() if self.is_loose(sha)}
+        packed = {dest: sha for dest, sha in files.items() if dest not in loose}
+        copy_files(((self.object_path(sha), dest) for dest, sha in loose.items()), jobs, writable=True)
+        with tracing.span("unpack files"):
+            make_parent_folders(packed)
+            map_parallel(lambda item: self._write_blob(item[1], item[0]), packed.items(), jobs)
+        return len(files)
+
+    def repack(self, trees: list[tuple[str, dict[str, str]]], prune: bool = False) -> tuple[int, int, int]:
+        """Pack all objects into one compressed, delta-encoded pack file.
+
+        Trees are given oldest first as (tree hash, entries); each revision of a path,
+        and each tree, is stored as a delta against the next newer one. With prune,
+        objects no tree refers to are dropped.
+        Returns (objects packed, bytes before, bytes after).
+        """
+        histories = {}
+        for tree_sha, tree in trees:
+            for rel_path, sha in [(None, tree_sha), *tree.items()]:
+                history = histories.setdefault(rel_path, [])
+                if not history or history[-1] != sha:
+                    history.append(sha)
+        bases = plan_deltas(list(histories.values()))
+        loose = set(self.loose_objects())
+        packed = {sha for pack in self.packs for sha in pack.shas()}
+        # Chunked objects stay as chunk lists; their chunks are packed like any blob.
+        chunked = {sha: [chunk for chunk, _ in self.read_manifest(sha)["chunks"]] for sha in self.chunked_objects()}
+        used_chunked = set(bases) & set(chunked) if prune else set(chunked)
+        chunks = {chunk for sha in used_chunked for chunk in chunked[sha]}
+        keep = (set(bases) if prune else set(bases) | loose | packed) - set(chunked) | chunks
+        objects = [(sha, bases.get(sha) if bases.get(sha) not in chunked else None) for sha in sorted(keep)]
+        size_before = self._storage_size()
+        with tracing.span("write pack"):
+            new_pack = write_pack(self.pack_path, objects, self.read_bytes)
+        old_packs = [pack.pack_path for pack in self.packs]
+        self.close()
+        for pack_file in old_packs:
+            if pack_file != new_pack:
+                os.remove(pack_file)
+                os.remove(pack_file[:-len(".pack")] + ".idx")
+        for sha in loose:
+            os.remove(self.object_path(sha))
+        for sha in set(chunked) - used_chunked:
+            os.remove(self.manifest_path(sha))
+        for folder in os.scandir(self.objects_path):
+            if folder.is_dir() and len(folder.name) == 2 and not os.listdir(folder.path):
+                os.rmdir(folder.path)
+        return len(objects), size_before, self._storage_size()
+
+    def _storage_size(self) -> int:
+        """Return the number of bytes used by loose objects and packs."""
+        total = 0
+        for root, _, files in os.walk(self.objects_path):
+            total += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+        return total
+
+    def write_tree(self, entries: dict[str, str], durable: bool = False) -> str:
+        """Store a tree (relative path -> blob hash) and return its hash."""
+        # One entry per line keeps successive trees cheap to delta-encode in packs.
+        return self.store_bytes(json.dumps(entries, sort_keys=True, indent=0).encode(), durable)
+
+    def read_tree(self, tree_sha: str | None) -> dict[str, str]:
+        """Return the entries of a stored tree (empty for no tree)."""
+        if not tree_sha:
+            return {}
+        return json.loads(self.read_bytes(tree_sha))
+
+    def needs_migration(self) -> bool:
+        """Check if the repository still uses commit folders or per-commit manifests."""
+        return not os.path.isdir(self.objects_path) or os.path.isdir(self.committed_path)
+
+    def migrate(self) -> dict[str, str]:
+        """Convert committed/ folders and manifests into tree objects, in place.
+
+        Returns the tree hash of every migrated commit (commit hash -> tree hash). The old
+        layout is kept until finish_migration, so an interrupted migration can run again.
+        """
+        os.makedirs(self.objects_path, exist_ok=True)
+        if not os.path.isdir(self.committed_path):
+            return {}
+        trees = {}
+        for entry in os.scandir(self.committed_path):
+            if entry.is_dir():
+                files = list_all_files_recursively(entry.path, include_wit=True)
+                tree = {
+                    rel_path: self.store_file(os.path.join(entry.path, rel_path), link=True) for rel_path in files
+                }
+                trees[entry.name] = self.write_tree(tree)
+            elif entry.name.endswith(".json"):
+                with open(entry.path, "r") as file:
+                    trees[entry.name[:-len(".json")]] = self.write_tree(json.load(file))
+        return trees
+
+    def finish_migration(self):
+        """Remove the old layout once the migrated trees are recorded with their commits."""
+        if os.path.isdir(self.committed_path):
+            shutil.rmtree(self.committed_path)
@@ -0,0 +1,186 @@
+import os, mmap, zlib, struct, hashlib
+from bisect import bisect_left
+from transfer import fsync_folder
+
+PACK_MAGIC = b"WPCK"
+IDX_MAGIC = b"WIDX"
+VERSION = 1
+FULL, DELTA = 1, 2
+SHA_SIZE = 20
+ENTRY_HEADER = struct.Struct(">BI")
+IDX_RECORD = struct.Struct(">20sQ")
+FANOUT = struct.Struct(">256I")
+
+DELTA_BLOCK = 16
+DELTA_MAX_SIZE = 4 * 1024 * 1024
+MAX_DELTA_DEPTH = 10
+COPY_OP, INSERT_OP = b"\x01", b"\x00"
+
+
+def make_delta(base: bytes, target: bytes) -> bytes:
+    """Encode target as copy/insert instructions against base."""
+    blocks = {}
+    for offset in range(0, len(base) - DELTA_BLOCK + 1, DELTA_BLOCK):
+        blocks.setdefault(base[offset:offset + DELTA_BLOCK], offset)
+    out = []
+    literal_start = i = 0
+    while i + DELTA_BLOCK <= len(target):
+        offset = blocks.get(target[i:i + DELTA_BLOCK])
+        if offset is None:
+            i += 1
+            continue
+        length = DELTA_BLOCK
+        while offset + length < len(base) and i + length < len(target) and base[offset + length] == target[i + length]:
+            length += 1
+        if literal_start < i:
+            out.append(INSERT_OP + struct.pack(">I", i - literal_start) + target[literal_start:i])
+        out.append(COPY_OP + struct.pack(">II", offset, length))
+        i += length
+        literal_start = i
+    if literal_start < len(target):
+        out.append(INSERT_OP + struct.pack(">I", len(target) - literal_start) + target[literal_start:])
+    return b"".join(out)
+
+
+def apply_delta(base: bytes, delta: bytes) -> bytes:
+    """Rebuild the target content from base and a delta made by make_delta."""
+    out = []
+    pos = 0
+    while pos < len(delta):
+        op = delta[pos:pos + 1]
+        if op == COPY_OP:
+            offset, length = struct.unpack_from(">II", delta, pos + 1)
+            out.append(base[offset:offset + length])
+            pos += 9
+        else:
+            (length,) = struct.unpack_from(">I", delta, pos + 1)
+            out.append(delta[pos + 5:pos + 5 + length])
+            pos += 5 + length
+    return b"".join(out)
+
+
+class PackReader:
+    """Reads objects from a pack file through its offset index, using mmap."""
+
+    def __init__(self, pack_path: str):
+        """Map the pack and its .idx file."""
+        self.pack_path = pack_path
+        self.idx_path = pack_path[:-len(".pack")] + ".idx"
+        self._pack_file = open(pack_path, "rb")
+        self._idx_file = open(self.idx_path, "rb")
+        self.pack = mmap.mmap(self._pack_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.idx = mmap.mmap(self._idx_file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.pack[:4] != PACK_MAGIC or self.idx[:4] != IDX_MAGIC:
+            raise ValueError(f"not a wit pack: {pack_path}")
+        self.fanout = FANOUT.unpack_from(self.idx, 8)
+        self.records_start = 8 + FANOUT.size
+
+    def __len__(self) -> int:
+        """Return the number of objects in the pack."""
+        return self.fanout[255]
+
+    def _sha_at(self, position: int) -> bytes:
+        """Return the raw hash of the index record at a position."""
+        start = self.records_start + position * IDX_RECORD.size
+        return self.idx[start:start + SHA_SIZE]
+
+    def find(self, sha: str) -> int | None:
+        """Return the pack offset of an object, or None if it is not in this pack."""
+        raw = bytes.fromhex(sha)
+        lo = self.fanout[raw[0] - 1] if raw[0] else 0
+        hi = self.fanout[raw[0]]
+        position = bisect_left(range(lo, hi), raw, key=self._sha_at) + lo
+        if position < hi and self._sha_at(position) == raw:
+            return IDX_RECORD.unpack_from(self.idx, self.records_start + position * IDX_RECORD.size)[1]
+        return None
+
+    def shas(self):
+        """Yield the hashes of all objects in the pack."""
+        for position in range(len(self)):
+            yield self._sha_at(position).hex()
+
+    def read(self, sha: str, resolve) -> bytes | None:
+        """Return an object's content; `resolve` reads delta bases from any store."""
+        offset = self.find(sha)
+        if offset is None:
+            return None
+        kind, size = ENTRY_HEADER.unpack_from(self.pack, offset)
+        start = offset + ENTRY_HEADER.size
+        if kind == FULL:
+            return zlib.decompress(self.pack[start:start + size])
+        base_sha = self.pack[start:start + SHA_SIZE].hex()
+        delta = zlib.decompress(self.pack[start + SHA_SIZE:start + SHA_SIZE + size])
+        return apply_delta(resolve(base_sha), delta)
+
+    def close(self):
+        """Unmap and close the pack files."""
+        self.pack.close()
+        self.idx.close()
+        self._pack_file.close()
+        self._idx_file.close()
+
+
+def write_pack(pack_dir: str, objects: list[tuple[str, str | None]], read) -> str | None:
+    """Write objects (hash, delta base hash or None), read one at a time, as a pack plus index."""
+    if not objects:
+        return None
+    os.makedirs(pack_dir, exist_ok=True)
+    tmp_pack = os.path.join(pack_dir, f"tmp-{os.getpid()}.pack")
+    offsets = {}
+    checksum = hashlib.sha1()
+    with open(tmp_pack, "wb") as pack:
+        pack.write(PACK_MAGIC + struct.pack(">I", VERSION))
+        for sha, base_sha in objects:
+            offsets[sha] = pack.tell()
+            entry = _encode_entry(read(sha), base_sha and read(base_sha), base_sha)
+            pack.write(entry)
+            checksum.update(entry)
+        pack.flush()
+        os.fsync(pack.fileno())
+    name = os.path.join(pack_dir, f"pack-{checksum.hexdigest()}")
+    _write_index(f"{name}.idx", offsets)
+    os.replace(tmp_pack, f"{name}.pack")
+    fsync_folder(pack_dir)
+    return f"{name}.pack"
+
+
+def _encode_entry(content: bytes, base: bytes | None, base_sha: str | None) -> bytes:
+    """Encode one pack entry, as a delta when that is smaller than the full blob."""
+    full = zlib.compress(content, 9)
+    if base is not None and len(content) <= DELTA_MAX_SIZE and len(base) <= DELTA_MAX_SIZE:
+        delta = zlib.compress(make_delta(base, content), 9)
+        if len(delta) + SHA_SIZE < len(full):
+            return ENTRY_HEADER.pack(DELTA, len(delta)) + bytes.fromhex(base_sha) + delta
+    return ENTRY_HEADER.pack(FULL, len(full)) + full
+
+
+def _write_index(idx_path: str, offsets: dict[str, int]):
+    """Write the sorted offset index (with a 256-entry fanout table) for a pack."""
+    records = sorted((bytes.fromhex(sha), offset) for sha, offset in offsets.items())
+    fanout = [0] * 256
+    for raw, _ in records:
+        fanout[raw[0]] += 1
+    for i in range(1, 256):
+        fanout[i] += fanout[i - 1]
+    tmp = f"{idx_path}.tmp"
+    with open(tmp, "wb") as idx:
+        idx.write(IDX_MAGIC + struct.pack(">I", VERSION) + FANOUT.pack(*fanout))
+        idx.writelines(IDX_RECORD.pack(raw, offset) for raw, offset in records)
+        idx.flush()
+        os.fsync(idx.fileno())
+    os.replace(tmp, idx_path)
+
+
+def plan_deltas(path_histories: list[list[str]]) -> dict[str, str | None]:
+    """Choose a delta base for each object: the next newer revision of the same path."""
+    bases = {}
+    depths = {}
+    for history in path_histories:
+        newer = None
+        for sha in reversed(history):
+            if sha not in bases:
+                usable = newer is not None and depths[newer] < MAX_DELTA_DEPTH
+                bases[sha] = newer if usable else None
+                depths[sha] = depths[newer] + 1 if usable else 0
+            newer = sha
+    return bases
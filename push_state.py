@@ -0,0 +1,28 @@
+import os, json, threading
+from file_manager import wit_subfolder
+
+
+class PushState:
+    """Remembers (in .wit/push_state) which file contents each server endpoint has accepted."""
+
+    def __init__(self, path: str):
+        """Initialize with repository path and load the saved state."""
+        self.path = path
+        self.state_path = wit_subfolder(path, "push_state")
+        try:
+            with open(self.state_path, "r") as file:
+                self.endpoints = json.load(file)
+        except (FileNotFoundError, ValueError):
+            self.endpoints = {}
+
+    def accepted(self, endpoint: str) -> dict[str, str]:
+        """Return the files (path -> content hash) the endpoint has already accepted."""
+        return self.endpoints.get(endpoint, {})
+
+    def update(self, endpoint: str, accepted: dict[str, str]):
+        """Replace the accepted files for an endpoint and save the state."""
+        self.endpoints[endpoint] = accepted
+        tmp = f"{self.state_path}.tmp{os.getpid()}.{threading.get_ident()}"
+        with open(tmp, "w") as file:
+            json.dump(self.endpoints, file, separators=(",", ":"))
+        os.replace(tmp, self.state_path)
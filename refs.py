@@ -0,0 +1,96 @@
+import os, re
+from file_manager import wit_subfolder
+from transfer import fsync_folder
+
+DEFAULT_BRANCH = "master"
+HEAD_PREFIX = "ref: refs/heads/"
+BRANCH_NAME = re.compile(r"^[A-Za-z0-9_][A-Za-z0-9._-]*(/[A-Za-z0-9_][A-Za-z0-9._-]*)*$")
+
+
+class Refs:
+    """Named branch refs under .wit/refs/heads and the HEAD pointer in .wit/HEAD."""
+
+    def __init__(self, path: str):
+        """Initialize with repository path."""
+        self.path = path
+        self.head_path = wit_subfolder(path, "HEAD")
+        self.heads_path = os.path.join(wit_subfolder(path, "refs"), "heads")
+
+    @staticmethod
+    def _read(file_path: str) -> str | None:
+        """Return the stripped content of a ref file, or None if it does not exist."""
+        try:
+            with open(file_path, "r") as file:
+                return file.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _write(file_path: str, content: str):
+        """Replace a ref file atomically and durably."""
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        tmp = f"{file_path}.lock"
+        with open(tmp, "w") as file:
+            file.write(content + "\n")
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp, file_path)
+        fsync_folder(os.path.dirname(file_path))
+
+    def exists(self) -> bool:
+        """Check if the HEAD file exists."""
+        return os.path.exists(self.head_path)
+
+    def init(self, hash_code: str | None = None, branch: str = DEFAULT_BRANCH):
+        """Point HEAD at a branch, creating the branch at hash_code if given."""
+        if hash_code:
+            self.set_branch(branch, hash_code)
+        self._write(self.head_path, HEAD_PREFIX + branch)
+
+    def branch_path(self, name: str) -> str:
+        """Return the ref file path of a branch."""
+        return os.path.join(self.heads_path, *name.split("/"))
+
+    def current_branch(self) -> str | None:
+        """Return the branch HEAD points to, or None if HEAD is detached."""
+        head = self._read(self.head_path) or ""
+        return head[len(HEAD_PREFIX):] if head.startswith(HEAD_PREFIX) else None
+
+    def head_commit(self) -> str | None:
+        """Return the commit hash HEAD resolves to, or None before the first commit."""
+        branch = self.current_branch()
+        return self.branch_commit(branch) if branch else self._read(self.head_path)
+
+    def update_head(self, hash_code: str):
+        """Move the current branch (or a detached HEAD) to a new commit."""
+        branch = self.current_branch()
+        if branch:
+            self.set_branch(branch, hash_code)
+        else:
+            self.detach(hash_code)
+
+    def branch_commit(self, name: str) -> str | None:
+        """Return the commit hash a branch points to, or None if it does not exist."""
+        return self._read(self.branch_path(name)) if BRANCH_NAME.match(name) else None
+
+    def set_branch(self, name: str, hash_code: str):
+        """Create or move a branch."""
+        self._write(self.branch_path(name), hash_code)
+
+    def switch_branch(self, name: str):
+        """Attach HEAD to a branch."""
+        self._write(self.head_path, HEAD_PREFIX + name)
+
+    def detach(self, hash_code: str):
+        """Point HEAD directly at a commit."""
+        self._write(self.head_path, hash_code)
+
+    def branches(self) -> list[str]:
+        """Return the names of all branches."""
+        names = []
+        for root, _, files in os.walk(self.heads_path):
+            rel_root = os.path.relpath(root, self.heads_path)
+            for file in files:
+                if not file.endswith(".lock"):
+                    names.append(file if rel_root == os.curdir else f"{rel_root}/{file}".replace(os.sep, "/"))
+        return sorted(names)
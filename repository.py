@@ -1,17 +1,48 @@
 import os
-import io
-import requests
-from requests.exceptions import RequestException, HTTPError
+import re
+import sys
+import json
 from functools import wraps
 from file_manager import (
-    should_ignore, is_valid_path, create_new_folder_in_path,
-    copy_file, is_empty_folder, list_all_files_recursively,
-    delete_empty_folders, wit_subfolder, _clear_working_directory,
+    is_valid_path, create_new_folder_in_path,
+    list_all_files_recursively, walk_files, walk_roots,
+    delete_empty_folders, wit_subfolder, delete_file,
     clear_all_file_and_directory
 )
+from ignore_rules import get_ignore_rules
 from commit_manager_csv import CommitManager
-
-URL = "http://localhost:8000"
+from refs import Refs, BRANCH_NAME, DEFAULT_BRANCH
+from object_store import ObjectStore
+from hasher import hash_file
+from index import Index
+from diff import diff_entries, format_stat, file_header, patch_paths, close_stores
+from lock import RepoLock, LockError
+from fsck import find_temp_files, check_objects, check_commits, index_is_readable
+from transfer import copy_files
+from push_state import PushState
+from analysis_cache import AnalysisCache
+import tracing
+
+URL = os.environ.get("WIT_SERVER_URL", "http://localhost:8000")
+
+def _migrate_objects(path):
+    """Move a repository in an older layout to the object store, under the lock; False if it cannot be locked."""
+    store = ObjectStore(path)
+    if not store.needs_migration():
+        return True
+    try:
+        with RepoLock(path):
+            # Another process may have migrated the repository while this one waited.
+            if store.needs_migration():
+                trees = store.migrate()
+                if trees:
+                    CommitManager(path).adopt_trees(trees)
+                    print(f"Migrated {len(trees)} commit(s) to the object store.")
+                store.finish_migration()
+    except LockError as e:
+        print(f"fatal: {e}")
+        return False
+    return True
 
 def require_init(func):
     """Decorator to ensure the path is a Wit repository before running the function."""
@@ -20,278 +51,948 @@ def require_init(func):
         if not os.path.exists(wit_subfolder(path)):
             print("fatal: not a wit repository (or any of the parent directories): .wit")
             return
+        if not _migrate_objects(path):
+            return
         return func(path, *args, **kwargs)
     return wrapper
 
+def with_lock(func):
+    """Decorator to run a command under the repository lock, after recovering an interrupted commit."""
+    @wraps(func)
+    def wrapper(path, *args, **kwargs):
+        try:
+            with RepoLock(path):
+                recovered = _recover_interrupted_commit(path)
+                if recovered:
+                    print(recovered)
+                return func(path, *args, **kwargs)
+        except LockError as e:
+            print(f"fatal: {e}")
+    return wrapper
+
 def init_repo(path):
-    """Initialize a new Wit repository with required folders."""
-    create_new_folder_in_path(wit_subfolder(path))
-    create_new_folder_in_path(wit_subfolder(path, "committed"))
-    create_new_folder_in_path(wit_subfolder(path, "staging"))
-    print(f"Initialized empty Wit repository in {wit_subfolder(path)}/")
-
-def _copy_to_staging(path, rel_path, staging_path):
-    """Copy a file to the staging area."""
-    src = os.path.join(path, rel_path)
-    dest = os.path.join(staging_path, rel_path)
-    copy_file(src, dest)
-    print(f"Added: {rel_path}")
+    """Initialize a new Wit repository with required folders; an existing one keeps its HEAD."""
+    existed = os.path.exists(wit_subfolder(path))
+    for folder in (wit_subfolder(path), wit_subfolder(path, "staging"), wit_subfolder(path, "objects")):
+        if not os.path.isdir(folder):
+            create_new_folder_in_path(folder)
+    refs = Refs(path)
+    if not refs.exists():
+        refs.init()
+    if existed:
+        print(f"Reinitialized existing Wit repository in {wit_subfolder(path)}/")
+    else:
+        print(f"Initialized empty Wit repository in {wit_subfolder(path)}/")
+
+def _read_staged_removals(path):
+    """Get the files staged for removal in the next commit."""
+    try:
+        with open(wit_subfolder(path, "removed"), "r") as file:
+            return {line.rstrip("\n") for line in file if line.strip()}
+    except FileNotFoundError:
+        return set()
+
+def _write_staged_removals(path, removals):
+    """Save the files staged for removal in the next commit."""
+    removed_path = wit_subfolder(path, "removed")
+    if not removals:
+        delete_file(removed_path)
+        return
+    with open(removed_path, "w") as file:
+        file.writelines(f"{rel_path}\n" for rel_path in sorted(removals))
+
+def _resolve_commit(commit_mgr, revision):
+    """Find the commit a revision names (HEAD, branch, hash or unique prefix); print why if none."""
+    matches = commit_mgr.find(revision)
+    if len(matches) == 1:
+        return matches[0]
+    if matches:
+        print(f"error: short hash '{revision}' is ambiguous; use more characters.")
+    else:
+        print(f"error: path spec '{revision}' did not match any file(s) known to wit")
+    return None
+
+def _write_journal(path, commit):
+    """Durably record a commit that is about to be published."""
+    with open(wit_subfolder(path, "journal"), "w") as file:
+        json.dump({"commit": commit.hash_code}, file)
+        file.flush()
+        os.fsync(file.fileno())
+
+def _read_journal(path):
+    """Get the hash of a commit whose publication was interrupted, if any."""
+    try:
+        with open(wit_subfolder(path, "journal"), "r") as file:
+            return json.load(file).get("commit")
+    except (FileNotFoundError, ValueError, AttributeError):
+        return None
+
+def _recover_interrupted_commit(path):
+    """Finish or roll back a commit interrupted before it cleaned up; describe what was done."""
+    if not os.path.exists(wit_subfolder(path, "journal")):
+        return None
+    hash_code = _read_journal(path)
+    commit_mgr = CommitManager(path)
+    if hash_code and commit_mgr.get_last_hash() == hash_code:
+        # HEAD already moved, so the commit is published; only the staging cleanup is missing.
+        clear_all_file_and_directory(wit_subfolder(path, "staging"))
+        _write_staged_removals(path, set())
+        message = f"Recovered: finished interrupted commit {hash_code}."
+    else:
+        if hash_code:
+            commit_mgr.discard(hash_code)
+        message = f"Recovered: rolled back interrupted commit {hash_code}; staged changes are kept."
+    delete_file(wit_subfolder(path, "journal"))
+    return message
+
+def _get_head_tree(path):
+    """Get the tree (path -> content hash) of the last commit."""
+    return _get_committed_tree(ObjectStore(path), CommitManager(path).get_last_commit())
+
+def _copy_to_staging(path, rel_paths, staging_path, jobs=None):
+    """Copy files to the staging area and print a summary."""
+    pairs = [(os.path.join(path, p), os.path.join(staging_path, p)) for p in rel_paths]
+    copied = copy_files(pairs, jobs)
+    if copied == 1:
+        print(f"Added: {rel_paths[0]}")
+    else:
+        print(f"Added {copied} file(s) to staging.")
+
+def _print_dry_run(to_stage, to_remove, deleted=()):
+    """Print what an add would stage without touching the staging area."""
+    for rel_path in sorted(to_stage):
+        print(f"Would add: {rel_path}")
+    for rel_path in sorted(to_remove):
+        print(f"Would remove: {rel_path}")
+    for rel_path in deleted:
+        print(f"Would unstage: {rel_path}")
+    if not to_stage and not to_remove and not deleted:
+        print("Nothing new to add.")
+
+def _scan_files(base_path, **options):
+    """Get the non-ignored files under a folder with their (cached) stat data."""
+    with tracing.span("walk"):
+        return {record.rel_path: record.stat() for record in walk_files(base_path, **options)}
+
+def _has_staged_files(staging_path):
+    """Check if any file is staged (empty folders left in staging do not count)."""
+    return next(walk_files(staging_path, include_wit=True), None) is not None
+
+def _stage_changes(path, files, removed, head_tree, jobs=None, dry_run=False, scope=None):
+    """Stage files (path -> stat data) that are new or modified since the last commit, plus removals.
+
+    scope is the folder that was added ("" for the whole tree); staged files under it that
+    were deleted from the working tree are unstaged.
+    """
+    staging_path = wit_subfolder(path, "staging")
+    staging_rel = os.path.relpath(staging_path, path)
+    staged = _scan_files(staging_path, include_wit=True)
+    index = Index(path)
+    hashes = index.hash_many(files, jobs)
+    staged_hashes = index.hash_many(
+        {os.path.join(staging_rel, p): staged[p] for p in files if p in staged and hashes[p] != head_tree.get(p)}, jobs
+    )
+    to_stage = {}
+    to_unstage = []
+    for rel_path, sha in hashes.items():
+        staged_rel = os.path.join(staging_rel, rel_path)
+        if sha == head_tree.get(rel_path):
+            if rel_path in staged:
+                to_unstage.append(staged_rel)
+        elif rel_path not in staged or staged_hashes[staged_rel] != sha:
+            to_stage[rel_path] = sha
+    deleted = []
+    if scope is not None:
+        prefix = os.path.join(scope, "") if scope else ""
+        deleted = sorted(
+            p for p in staged
+            if p.startswith(prefix) and p not in files and not os.path.lexists(os.path.join(path, p))
+        )
+        to_unstage += [os.path.join(staging_rel, p) for p in deleted]
+    removals = _read_staged_removals(path)
+    to_remove = removed - removals
+    if dry_run:
+        index.save()
+        _print_dry_run(to_stage, to_remove, deleted)
+        return
+    for staged_rel in to_unstage:
+        delete_file(os.path.join(path, staged_rel))
+        index.forget(staged_rel)
+    if to_unstage:
+        delete_empty_folders(staging_path)
+    if to_stage:
+        _copy_to_staging(path, list(to_stage), staging_path, jobs)
+        for rel_path, sha in to_stage.items():
+            index.record(os.path.join(staging_rel, rel_path), sha)
+    index.save()
+    _write_staged_removals(path, (removals - set(files)) | removed)
+    if to_remove:
+        print(f"Removed {len(to_remove)} file(s) from the next commit.")
+    if deleted:
+        print(f"Unstaged {len(deleted)} deleted file(s).")
+    if not to_stage and not to_remove and not deleted:
+        print("Nothing new to add.")
 
 @require_init
-def add_repo(path, name):
+@with_lock
+def add_repo(path, name, jobs=None, dry_run=False):
     """Add a specific file or directory to staging."""
     full_path = os.path.join(path, name)
-    staging_path = wit_subfolder(path, "staging")
     if not is_valid_path(full_path):
         print(f"fatal: pathspec '{name}' did not match any files")
         return
+    head_tree = _get_head_tree(path)
+    rules = get_ignore_rules(path)
+    name = os.path.relpath(full_path, path)
+    files = {}
+    removed = set()
+    scope = None
     if os.path.isfile(full_path):
-        if not should_ignore(name):
-            _copy_to_staging(path, name, staging_path)
+        if not rules.match(name):
+            files[name] = None
     elif os.path.isdir(full_path):
-        for root, _, files in os.walk(full_path):
-            for file in files:
-                abs_file_path = os.path.join(root, file)
-                rel_path = os.path.relpath(abs_file_path, path)
-                if not should_ignore(abs_file_path):
-                    _copy_to_staging(path, rel_path, staging_path)
+        start = "" if name == os.curdir else name
+        if not start or not rules.match(start, is_dir=True):
+            files = _scan_files(path, rules=rules, start=start)
+        prefix = os.path.join(start, "") if start else ""
+        removed = {p for p in head_tree if p.startswith(prefix)} - set(files)
+        scope = start
+    _stage_changes(path, files, removed, head_tree, jobs, dry_run, scope)
 
 @require_init
-def add_all_repo(path):
-    """Add all non-ignored files in the working directory to staging."""
-    staging_path = wit_subfolder(path, "staging")
-    files = list_all_files_recursively(path, include_wit=False)
-    for rel_path in files:
-        _copy_to_staging(path, rel_path, staging_path)
-
-def _move_staged_files_to_commit(staging_path, commit_folder, prev_files):
-    """Move staged files to a commit folder and return info on changes."""
+@with_lock
+def add_all_repo(path, jobs=None, dry_run=False):
+    """Add all new or modified non-ignored files in the working directory to staging."""
+    head_tree = _get_head_tree(path)
+    files = _scan_files(path)
+    removed = set(head_tree) - set(files)
+    _stage_changes(path, files, removed, head_tree, jobs, dry_run, scope="")
+
+def _store_staged_files(path, store, staging_path, prev_files, jobs=None):
+    """Store staged files as blobs and return the commit tree and info on changes."""
     staged_files = list_all_files_recursively(staging_path, include_wit=True)
-    new_files = []
-    for rel_path in staged_files:
-        src = os.path.join(staging_path, rel_path)
-        dst = os.path.join(commit_folder, rel_path)
-        copy_file(src, dst)
-        if rel_path not in prev_files:
-            new_files.append(rel_path)
+    staging_rel = os.path.relpath(staging_path, path)
+    index = Index(path)
+    # The hashes recorded when the files were staged are reused unless the files changed since.
+    known = index.hash_many({os.path.join(staging_rel, f): None for f in staged_files}, jobs)
+    shas = [known[os.path.join(staging_rel, f)] for f in staged_files]
+    # Staged files are deleted after the commit, so their objects can be hard links to them.
+    hashes = store.store_files(
+        [os.path.join(staging_path, f) for f in staged_files], jobs, durable=True, shas=shas, link=True
+    )
+    for rel_path in known:
+        index.forget(rel_path)
+    index.save()
+    tree = dict(zip(staged_files, hashes))
+    new_files = [rel_path for rel_path in staged_files if rel_path not in prev_files]
     delete_empty_folders(staging_path)
-    return staged_files, new_files
+    return tree, staged_files, new_files
 
 @require_init
-def commit_repo(path, message):
-    """Create a new commit from staged files with a message."""
+@with_lock
+def commit_repo(path, message, jobs=None):
+    """Create a new commit from the last commit's tree plus staged changes."""
     staging_path = wit_subfolder(path, "staging")
-    committed_path = wit_subfolder(path, "committed")
-    if is_empty_folder(staging_path):
+    removals = _read_staged_removals(path)
+    if not _has_staged_files(staging_path) and not removals:
         print("There is no need to commit until you have made an addition.")
         return
     commit_mgr = CommitManager(path)
-    last_hash = commit_mgr.get_last_hash()
-    commit = commit_mgr.save(message)
-    commit_folder = os.path.join(committed_path, commit.hash_code)
-    create_new_folder_in_path(commit_folder)
-
-    prev_files = set()
-    if last_hash:
-        prev_commit_path = os.path.join(committed_path, last_hash)
-        prev_files = set(list_all_files_recursively(prev_commit_path, include_wit=True))
-
-    staged_files, new_files = _move_staged_files_to_commit(staging_path, commit_folder, prev_files)
+    store = ObjectStore(path)
+    prev_tree = _get_committed_tree(store, commit_mgr.get_last_commit())
+    staged_tree, staged_files, new_files = _store_staged_files(path, store, staging_path, set(prev_tree), jobs)
+    tree = {rel_path: sha for rel_path, sha in prev_tree.items() if rel_path not in removals}
+    tree.update(staged_tree)
+    tree_sha = store.write_tree(tree, durable=True)
+    store.sync_objects([*staged_tree.values(), tree_sha])
+    commit = commit_mgr.create(message, tree_sha)
+    _write_journal(path, commit)
+    commit_mgr.publish(commit)
     clear_all_file_and_directory(staging_path)
-
-    print(f"[master {commit.hash_code}] {message}")
-    print(f"{len(staged_files)} file(s) changed, {len(new_files)} insertions(+)")
+    _write_staged_removals(path, set())
+    delete_file(wit_subfolder(path, "journal"))
+
+    deleted = sorted(removals & set(prev_tree))
+    summary = f"{len(staged_files) + len(deleted)} file(s) changed, {len(new_files)} insertions(+)"
+    if deleted:
+        summary += f", {len(deleted)} deletions(-)"
+    print(f"[{commit_mgr.refs.current_branch() or 'detached HEAD'} {commit.hash_code}] {message}")
+    print(summary)
     for file_name in staged_files:
         print(f" create mode 100644 {file_name}")
+    for file_name in deleted:
+        print(f" delete mode 100644 {file_name}")
 
 @require_init
-def log_repo(path):
-    """Print all previous commits."""
-    CommitManager(path).print_all()
-
-def _get_committed_files(committed_path, last_commit):
-    """Get all committed files from the last commit."""
+def log_repo(path, revision=None, limit=None, since=None, until=None, grep=None, oneline=False):
+    """Stream the commits reachable from HEAD (or a revision), newest first, with optional filters."""
+    commit_mgr = CommitManager(path)
+    start = None
+    if revision:
+        commit = _resolve_commit(commit_mgr, revision)
+        if commit is None:
+            return
+        start = commit.hash_code
+    try:
+        commit_mgr.print_all(limit, oneline, start=start, since=since, until=until, pattern=grep)
+        sys.stdout.flush()
+    except re.error as e:
+        print(f"fatal: invalid --grep pattern: {e}")
+    except BrokenPipeError:
+        _silence_stdout()
+
+def _silence_stdout():
+    """Stop quietly when the reader of our output (e.g. `wit log | head`) went away."""
+    os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+
+def _get_committed_tree(store, last_commit):
+    """Get the tree (path -> content hash) of the last commit."""
     if not last_commit:
-        return set()
-    last_commit_path = os.path.join(committed_path, last_commit.hash_code)
-    if not is_valid_path(last_commit_path):
-        return set()
-    return set(list_all_files_recursively(last_commit_path, include_wit=True))
+        return {}
+    return store.read_tree(last_commit.tree)
 
-def _get_working_directory_files(path):
-    """Get all current files in the working directory."""
-    return {f for f in list_all_files_recursively(path, include_wit=False) if not should_ignore(f)}
-
-def _print_staged_files(staged_files):
+def _hash_working_and_staged_files(path, index, jobs=None):
+    """Get content hashes of working-tree and staged files in a single walk."""
+    staging_path = wit_subfolder(path, "staging")
+    staging_rel = os.path.relpath(staging_path, path)
+    working, staged = {}, {}
+    with tracing.span("walk"):
+        for record in walk_roots([(staging_path, {"include_wit": True}), (path, {})]):
+            if record.base_path == staging_path:
+                staged[record.rel_path] = record.stat()
+            else:
+                working[record.rel_path] = record.stat()
+    hashes = index.hash_many({**working, **{os.path.join(staging_rel, p): st for p, st in staged.items()}}, jobs)
+    working_hashes = {rel_path: hashes[rel_path] for rel_path in working}
+    staged_hashes = {rel_path: hashes[os.path.join(staging_rel, rel_path)] for rel_path in staged}
+    return working_hashes, staged_hashes
+
+def _print_staged_files(staged_files, removals=()):
     """Print staged files for user reference."""
-    if staged_files:
+    if staged_files or removals:
         print("\nStaged files:")
         for f in sorted(staged_files):
             print(f"  {f}")
+        for f in sorted(removals):
+            print(f"  deleted: {f}")
     else:
         print("\nNo files staged for commit.")
 
-def _print_untracked_files(working_files, staged_files, committed_files):
-    """Print files that are not tracked by the system."""
-    untracked = working_files - staged_files - committed_files
-    if untracked:
-        print("\nUntracked files:")
-        for f in sorted(untracked):
+def _print_file_list(title, files):
+    """Print a titled list of files, if there are any."""
+    if files:
+        print(f"\n{title}:")
+        for f in files:
             print(f"  {f}")
 
+def _collect_status(working_hashes, staged_hashes, removals, committed_tree):
+    """Sort files into staged, removed, modified and untracked (each list sorted)."""
+    return {
+        "staged": sorted(staged_hashes),
+        "removed": sorted(removals),
+        # Tracked files whose content differs from the staged or committed version.
+        "modified": sorted(
+            f for f, sha in working_hashes.items()
+            if sha != staged_hashes.get(f, committed_tree.get(f, sha))
+        ),
+        "untracked": sorted(set(working_hashes) - set(staged_hashes) - set(committed_tree)),
+    }
+
+def _print_status(status):
+    """Print a status collected by _collect_status."""
+    print("=== Status ===")
+    _print_staged_files(status["staged"], status["removed"])
+    _print_file_list("Modified files", status["modified"])
+    _print_file_list("Untracked files", status["untracked"])
+
 @require_init
 def status_repo(path):
     """Show the status of files in the repository."""
-    staging_path = wit_subfolder(path, "staging")
-    committed_path = wit_subfolder(path, "committed")
     commit_mgr = CommitManager(path)
     last_commit = commit_mgr.get_last_commit()
-    staged_files = set(list_all_files_recursively(staging_path, include_wit=True))
-    committed_files = _get_committed_files(committed_path, last_commit)
-    working_dir_files = _get_working_directory_files(path)
-    print("=== Status ===")
-    _print_staged_files(staged_files)
-    _print_untracked_files(working_dir_files, staged_files, committed_files)
+    index = Index(path)
+    working_hashes, staged_hashes = _hash_working_and_staged_files(path, index)
+    committed_tree = _get_committed_tree(ObjectStore(path), last_commit)
+    index.prune()
+    index.save()
+    removals = _read_staged_removals(path)
+    _print_status(_collect_status(working_hashes, staged_hashes, removals, committed_tree))
+
+def _tree_side(tree):
+    """Describe a stored tree as one side of a diff: path -> (content hash, source)."""
+    return {rel_path: (sha, ("blob", sha)) for rel_path, sha in tree.items()}
+
+def _next_commit_side(path, head_tree, staged_hashes):
+    """Describe what the next commit would contain: HEAD minus staged removals, plus staged files."""
+    staging_path = wit_subfolder(path, "staging")
+    removals = _read_staged_removals(path)
+    side = {p: entry for p, entry in _tree_side(head_tree).items() if p not in removals}
+    for rel_path, sha in staged_hashes.items():
+        side[rel_path] = (sha, ("file", os.path.join(staging_path, rel_path)))
+    return side
+
+def _diff_sides(path, store, commits, staged, jobs=None):
+    """Return the (old, new) sides to compare for the given commits and --staged flag."""
+    if len(commits) == 2:
+        return tuple(_tree_side(store.read_tree(c.tree)) for c in commits)
+    index = Index(path)
+    working_hashes, staged_hashes = _hash_working_and_staged_files(path, index, jobs)
+    index.save()
+    head_tree = _get_head_tree(path)
+    base = _tree_side(store.read_tree(commits[0].tree)) if commits else _tree_side(head_tree)
+    next_commit = _next_commit_side(path, head_tree, staged_hashes)
+    if staged:
+        return base, next_commit
+    old = base if commits else next_commit
+    rules = get_ignore_rules(path)
+    tracked = {p for p in set(old) | set(next_commit) if not rules.match(p)}
+    new = {
+        p: (working_hashes[p], ("file", os.path.join(path, p)))
+        for p in tracked if p in working_hashes
+    }
+    return {p: entry for p, entry in old.items() if p in tracked}, new
+
+def _print_file_diff(result, old, new):
+    """Print the unified diff of one file."""
+    rel_path, _, _, binary, lines = result
+    print("\n".join(file_header(rel_path, old, new)))
+    if binary:
+        print(f"Binary files {'/dev/null' if old is None else 'a/' + rel_path} and "
+              f"{'/dev/null' if new is None else 'b/' + rel_path} differ")
+    elif lines:
+        print("\n".join(patch_paths(rel_path, old, new)))
+        print(b"\n".join(lines).decode("utf-8", errors="replace"))
 
 @require_init
-def checkout_repo(path, version_hash_code):
-    """Restore all files to a specific commit version."""
-    committed_version_path = os.path.join(wit_subfolder(path, "committed"), version_hash_code)
-    if not is_valid_path(committed_version_path):
-        print(f"error: path spec '{version_hash_code}' did not match any file(s) known to wit")
+def diff_repo(path, revisions=(), staged=False, stat=False, jobs=None):
+    """Show changes between the working tree, the staging area and commits."""
+    if len(revisions) > 2 or (staged and len(revisions) > 1):
+        print("usage: wit diff [--staged] [<commit>] | wit diff <commit> <commit>")
         return
-    committed_files = list_all_files_recursively(committed_version_path, include_wit=True)
-    _clear_working_directory(path, set(committed_files))
-    for rel_path in committed_files:
-        if should_ignore(rel_path):
-            continue
-        src = os.path.join(committed_version_path, rel_path)
-        dst = os.path.join(path, rel_path)
-        copy_file(src, dst)
-    print(f"Note: switching to {version_hash_code}.")
-
-def send_file_to_server(files_data, server_url):
-    """Send files to a server for analysis or alerts."""
+    commit_mgr = CommitManager(path)
+    commits = []
+    for revision in revisions:
+        commit = _resolve_commit(commit_mgr, revision)
+        if commit is None:
+            return
+        commits.append(commit)
+    old, new = _diff_sides(path, ObjectStore(path), commits, staged, jobs)
+    changed = sorted(p for p in set(old) | set(new) if old.get(p, (None,))[0] != new.get(p, (None,))[0])
+    sources = {p: (old[p][1] if p in old else None, new[p][1] if p in new else None) for p in changed}
+    entries = [(str(path), p, *sources[p], stat) for p in changed]
     try:
-        response = requests.post(server_url, files=files_data)
-        response.raise_for_status()
-        return response
-    except HTTPError as e:
-        return e.response
-    except RequestException as e:
-        print(f"[Error] Network error: {e}")
-        return None
+        with tracing.span("diff files"):
+            if stat:
+                for line in format_stat(list(diff_entries(entries, jobs))):
+                    print(line)
+            else:
+                for result in diff_entries(entries, jobs):
+                    _print_file_diff(result, *sources[result[0]])
+            sys.stdout.flush()
+    except BrokenPipeError:
+        _silence_stdout()
 
 @require_init
-def push_repo(path):
-    """Send committed Python files to the server for analysis."""
-    staging_path = wit_subfolder(path, "staging")
-    last_hash = CommitManager(path).get_last_hash()
-    if not is_empty_folder(staging_path) or not last_hash:
-        print("You must commit before pushing.")
-        return
-
-    committed_path = os.path.join(wit_subfolder(path, "committed"), last_hash)
-    files = [
-        f for f in list_all_files_recursively(committed_path, include_wit=True, include_graphs=True)
-        if f.endswith(".py")
-    ]
-    file_blobs = []
-    for f in files:
-        file_path = os.path.join(committed_path, f)
-        with open(file_path, 'rb') as file_obj:
-            content = file_obj.read()
-            file_blobs.append((f, content))
-
-    if not file_blobs:
-        print("[Notice] No Python files to analyze. Push aborted.")
-        return
-
-    def make_files_data():
-        data = [('files', (f, io.BytesIO(content))) for f, content in file_blobs]
-        data.append(('project_root', (None, str(path))))
-        return data
+@with_lock
+def repack_repo(path, prune=False):
+    """Compress all objects into a single delta-encoded pack file."""
+    store = ObjectStore(path)
+    trees = [(c.tree, store.read_tree(c.tree)) for c in CommitManager(path).get_all_commits() if c.tree]
+    count, size_before, size_after = store.repack(trees, prune=prune)
+    print(f"Packed {count} object(s): {size_before} -> {size_after} bytes.")
+
+def _plan_checkout(index, working_files, tree, jobs=None):
+    """Split a checkout into files to create, update and delete."""
+    to_create = {p: sha for p, sha in tree.items() if p not in working_files}
+    hashes = index.hash_many({p: working_files[p] for p in tree if p in working_files}, jobs)
+    to_update = {p: tree[p] for p, sha in hashes.items() if sha != tree[p]}
+    to_delete = sorted(set(working_files) - set(tree))
+    return to_create, to_update, to_delete
 
-    response = send_file_to_server(make_files_data(), URL + "/alerts")
-    if response is None:
-        print("[Error] No response received from server.")
+@require_init
+@with_lock
+def checkout_repo(path, version_hash_code, jobs=None):
+    """Switch to a branch or commit, touching only files that differ."""
+    commit_mgr = CommitManager(path)
+    branch = version_hash_code if commit_mgr.refs.branch_commit(version_hash_code) else None
+    commit = _resolve_commit(commit_mgr, version_hash_code)
+    if commit is None:
         return
+    store = ObjectStore(path)
+    tree = store.read_tree(commit.tree)
+    rules = get_ignore_rules(path)
+    tree = {rel_path: sha for rel_path, sha in tree.items() if not rules.match(rel_path)}
+    index = Index(path)
+    to_create, to_update, to_delete = _plan_checkout(index, _scan_files(path, rules=rules), tree, jobs)
+    for rel_path in to_delete:
+        delete_file(os.path.join(path, rel_path))
+        index.forget(rel_path)
+    to_write = {**to_create, **to_update}
+    store.checkout_files({os.path.join(path, p): sha for p, sha in to_write.items()}, jobs)
+    for rel_path, sha in to_write.items():
+        index.record(rel_path, sha)
+    index.save()
+    if branch:
+        commit_mgr.refs.switch_branch(branch)
+        print(f"Switched to branch '{branch}'.")
+    else:
+        commit_mgr.refs.detach(commit.hash_code)
+        print(f"Note: switching to {commit.hash_code} (detached HEAD).")
+    print(f"{len(to_create)} file(s) created, {len(to_update)} updated, {len(to_delete)} deleted.")
+
+def _restore_object(path, store, sha, known_files):
+    """Re-store a missing or corrupt object from a working-tree or staged file with the same content."""
+    store.discard(sha)
+    for rel_path in known_files.get(sha, ()):
+        full_path = os.path.join(path, rel_path)
+        if os.path.isfile(full_path) and hash_file(full_path) == sha:
+            store.store_file(full_path, sha, durable=True)
+            return f"restored from {rel_path}"
+    return "removed the damaged copy; the content is lost"
+
+def _remove_file(file_path):
+    """Delete a file for fsck --repair."""
+    os.remove(file_path)
+    return "removed"
+
+def _fsck_refs(commit_mgr, report):
+    """Check that HEAD and every branch point to stored commits."""
+    refs = commit_mgr.refs
+    newest = commit_mgr.data.read_last()
+
+    def reset_branch(name):
+        if newest:
+            refs.set_branch(name, newest.hash_code)
+            return f"reset to the newest stored commit {newest.hash_code}"
+        os.remove(refs.branch_path(name))
+        return "removed"
+
+    for name in refs.branches():
+        hash_code = refs.branch_commit(name)
+        if not commit_mgr.get_by_hash(hash_code or ""):
+            report(f"branch '{name}' points to missing commit {hash_code}", lambda name=name: reset_branch(name))
+    if refs.current_branch() is None and not commit_mgr.get_by_hash(refs.head_commit() or ""):
+        def attach_head():
+            refs.switch_branch(DEFAULT_BRANCH)
+            return f"HEAD now points to branch '{DEFAULT_BRANCH}'"
+        report(f"HEAD points to missing commit {refs.head_commit()}", attach_head)
+
+def _dangling_commits(commit_mgr, commits):
+    """Get the commits no branch or HEAD leads to."""
+    refs = commit_mgr.refs
+    reachable = set()
+    for start in [refs.head_commit(), *map(refs.branch_commit, refs.branches())]:
+        for commit in commit_mgr.iter_history(start):
+            if commit.hash_code in reachable:
+                break
+            reachable.add(commit.hash_code)
+    return [c.hash_code for c in commits if c.hash_code not in reachable]
 
+@require_init
+def fsck_repo(path, repair=False, jobs=None):
+    """Verify objects, commits and refs; with repair, fix what can be fixed."""
+    problems = []
+
+    def report(problem, fix=None):
+        problems.append(problem)
+        print(f"error: {problem}")
+        if repair and fix:
+            print(f"  fixed: {fix()}")
+
+    lock = RepoLock(path)
+    if lock.is_stale():
+        print(f"Removing stale lock left by pid {lock.owner()[0]}.")
     try:
-        json_response = response.json()
-    except Exception:
-        print("[Error] Server returned invalid JSON.")
-        print(response.text)
+        lock.acquire()
+    except LockError as e:
+        print(f"fatal: {e}")
         return
+    try:
+        if os.path.exists(wit_subfolder(path, "journal")):
+            report(f"interrupted commit {_read_journal(path)}", lambda: _recover_interrupted_commit(path))
+        for file_path in find_temp_files(path):
+            if file_path != lock.lock_path:
+                report(f"leftover temporary file {os.path.relpath(file_path, path)}",
+                       lambda file_path=file_path: _remove_file(file_path))
+        if not index_is_readable(path):
+            report("unreadable index", lambda: _remove_file(wit_subfolder(path, "index")) + " (it is rebuilt as needed)")
+
+        store = ObjectStore(path)
+        known_files = {}
+        for rel_path, entry in Index(path).entries.items():
+            known_files.setdefault(entry[3], []).append(rel_path)
+        with tracing.span("check objects"):
+            corrupt_loose, corrupt_packed = check_objects(store, jobs)
+        for sha in corrupt_loose:
+            report(f"corrupt object {sha}", lambda sha=sha: _restore_object(path, store, sha, known_files))
+        for sha in corrupt_packed:
+            report(f"corrupt packed object {sha}")
+
+        commit_mgr = CommitManager(path)
+        commits = commit_mgr.get_all_commits()
+        with tracing.span("check commits"):
+            commit_problems = check_commits(commits, store)
+        for hash_code, kind, detail in commit_problems:
+            if kind == "blob":
+                tree = store.read_tree(commit_mgr.get_by_hash(hash_code).tree)
+                sha = tree[detail]
+                report(f"commit {hash_code}: missing object {sha} for {detail}",
+                       lambda sha=sha: _restore_object(path, store, sha, known_files) if not store.has(sha) else "already restored")
+            else:
+                report(f"commit {hash_code}: missing {kind} {detail}")
+        _fsck_refs(commit_mgr, report)
+        for hash_code in _dangling_commits(commit_mgr, commits):
+            print(f"dangling commit {hash_code}")
+    finally:
+        lock.release()
+
+    if not problems:
+        print("fsck: no problems found.")
+    elif repair:
+        print(f"fsck: {len(problems)} problem(s) found.")
+    else:
+        print(f"fsck: {len(problems)} problem(s) found. Run 'wit fsck --repair' to fix what can be fixed.")
 
+@require_init
+def export_csv_repo(path, csv_path):
+    """Write the commit history (hash, message, timestamp per row) to a CSV file."""
+    count = CommitManager(path).export_csv(csv_path)
+    print(f"Exported {count} commit(s) to {csv_path}.")
+
+@require_init
+@with_lock
+def branch_repo(path, name=None):
+    """List branches, or create one at the current HEAD commit."""
+    refs = Refs(path)
+    if name is None:
+        current = refs.current_branch()
+        for branch in refs.branches():
+            print(f"{'*' if branch == current else ' '} {branch}")
+        if current is None:
+            print(f"* (HEAD detached at {refs.head_commit()})")
+        return
+    head = refs.head_commit()
+    if not BRANCH_NAME.match(name):
+        print(f"fatal: '{name}' is not a valid branch name.")
+    elif refs.branch_commit(name):
+        print(f"fatal: a branch named '{name}' already exists.")
+    elif not head:
+        print("fatal: not a valid object name: 'HEAD'. Commit before creating a branch.")
+    else:
+        refs.set_branch(name, head)
+        print(f"Created branch '{name}' at {head}.")
+
+PUSH_MESSAGES = {
+    "failed": "[Error] No Python files were processed successfully.",
+    "partial": "[Partial Success] Some files processed successfully.",
+    "success": "[Success] All files processed successfully.",
+}
+ANALYZE_MESSAGES = {
+    "failed": "[Error] No Python files were analyzed.",
+    "partial": "[Partial Success] Some files analyzed successfully.",
+    "success": "[Success] All files analyzed successfully.",
+}
+
+def _post_python_files(path, changed, unchanged, server_url, upload_options):
+    """Stream changed files plus a manifest of unchanged hashes; return the merged JSON reply."""
+    fields = [('project_root', str(path))]
+    if unchanged:
+        fields.append(('manifest', json.dumps(unchanged, sort_keys=True)))
+    # Sizes are looked up only for the files sent: for a packed blob that means decompressing it.
+    files = [(f, size(), opener) for f, (_, size, opener) in sorted(changed.items())]
+    # Imported here so that local commands never load requests and its dependencies.
+    with tracing.span("import requests"):
+        from uploader import Uploader
+    return Uploader(server_url, **upload_options).upload(fields, files)
+
+def _print_server_report(json_response, messages):
+    """Print the server's success/partial/failed verdict and errors."""
     status = json_response.get("status")
     errors = json_response.get("errors", [])
 
     if status == "failed":
-        print("[Error] No Python files were processed successfully.")
+        print(messages["failed"])
         for err in errors:
             print(f" - {err['file']}: {err['error']}")
     elif status == "partial":
-        print("[Partial Success] Some files processed successfully.")
+        print(messages["partial"])
         for err in errors:
             print(f" - {err['file']}: {err['error']}")
         print(json_response["message"])
     elif status == "success":
-        print("[Success] All files processed successfully.")
+        print(messages["success"])
         print(json_response["message"])
     else:
         print("[Warning] Unknown response status from server.")
         print(json_response)
 
-@require_init
-def analyze_only(path):
-    """Send all .py files in working directory for static analysis only."""
-    files = list_all_files_recursively(path, include_wit=False, include_graphs=False)
-    file_blobs = []
-    for f in files:
-        if not f.endswith(".py"):
-            continue
-        file_path = os.path.join(path, f)
-        with open(file_path, 'rb') as file_obj:
-            content = file_obj.read()
-            file_blobs.append((f, content))
-
-    if not file_blobs:
-        print("[Notice] No Python files to analyze. Analyze aborted.")
+def _accepted_files(files, accepted, sent, fresh, cached):
+    """Get the files (path -> hash) the server holds and passed after a reply.
+
+    Those are the sent files that came back clean plus the files it accepted earlier with
+    the same content; a file whose cached result is an error is never accepted.
+    """
+    kept = {
+        f: sha for f, sha in accepted.items()
+        if f in files and f not in sent and files[f][0] == sha and cached.get(f) is None
+    }
+    passed = {f: files[f][0] for f, error in fresh.items() if error is None}
+    return {**kept, **passed}
+
+def _has_file_results(json_response):
+    """Check if a reply says how each file it covers did (a failed reply only through its errors)."""
+    return json_response.get("status") in ("success", "partial") or bool(json_response.get("errors"))
+
+def _reply_results(rel_paths, json_response):
+    """Get per-file results (path -> error message or None) for the files a reply covers."""
+    errors = {err.get("file"): err.get("error") for err in json_response.get("errors", [])}
+    if json_response.get("status") not in ("success", "partial"):
+        # A failed reply says nothing about the files it does not list.
+        rel_paths = [f for f in rel_paths if f in errors]
+    return {f: errors.get(f) for f in rel_paths}
+
+def _build_report(results, message):
+    """Build a success/partial/failed reply from per-file results (path -> error or None)."""
+    errors = [{"file": f, "error": error} for f, error in sorted(results.items()) if error]
+    if not errors:
+        status = "success"
+    elif len(errors) == len(results):
+        status = "failed"
+    else:
+        status = "partial"
+    return {"status": status, "errors": errors, "message": message}
+
+def _cache_results(cache, server_url, files, sent, json_response):
+    """Store the per-file results a reply gives for the files sent and return them.
+
+    Files only listed in the manifest are left alone: the reply says nothing about them.
+    """
+    fresh = _reply_results(sent, json_response)
+    version = json_response.get("server_version")
+    if version:
+        cache.set_server_version(server_url, version)
+    unanswered = set(json_response.get("unanswered", ()))
+    results = {files[f][0]: error for f, error in fresh.items() if f not in unanswered}
+    cache.store(server_url, version or cache.server_version(server_url), results)
+    return fresh
+
+def _upload_python_files(path, files, endpoint, messages, upload_options, use_cache=True):
+    """Send only files that are neither cached nor accepted yet (files: path -> (hash, size function, opener))."""
+    server_url = URL + endpoint
+    cache = AnalysisCache(path)
+    cached = cache.lookup(server_url, {f: entry[0] for f, entry in files.items()}) if use_cache else {}
+    tracing.count("analysis cache hits", len(cached))
+    tracing.count("analysis cache misses", len(files) - len(cached))
+    if len(cached) == len(files):
+        print(f"[Notice] All {len(files)} file(s) served from the local analysis cache.")
+        _print_server_report(_build_report(cached, "Results served from the local analysis cache."), messages)
         return
-
-    def make_files_data():
-        data = [('files', (f, io.BytesIO(content))) for f, content in file_blobs]
-        data.append(('project_root', (None, str(path))))
-        return data
-
-    response = send_file_to_server(make_files_data(), URL + "/analyze")
-    if response is None:
-        print("[Error] No response received from server.")
+    state = PushState(path)
+    accepted = state.accepted(server_url)
+    changed = {f: v for f, v in files.items() if f not in cached and accepted.get(f) != v[0]}
+    unchanged = {f: entry[0] for f, entry in files.items() if f not in changed}
+    if unchanged:
+        print(f"[Notice] Sending {len(changed)} changed file(s); {len(unchanged)} unchanged"
+              f" ({len(cached)} cached).")
+    json_response = _post_python_files(path, changed, unchanged, server_url, upload_options)
+    if json_response is not None and json_response.get("full_upload_required") and unchanged:
+        print("[Notice] Server requested a full upload.")
+        changed, unchanged = files, {}
+        json_response = _post_python_files(path, changed, unchanged, server_url, upload_options)
+    if json_response is None:
         return
+    has_results = _has_file_results(json_response)
+    fresh = _cache_results(cache, server_url, files, changed, json_response) if has_results else {}
+    state.update(server_url, _accepted_files(files, accepted, changed, fresh, cached))
+    if has_results and unchanged:
+        # Files the server accepted earlier passed then; cached results say how the rest did.
+        earlier = {**{f: None for f in unchanged}, **cached}
+        json_response = _build_report({**earlier, **fresh}, json_response.get("message", ""))
+    _print_server_report(json_response, messages)
 
-    try:
-        json_response = response.json()
-    except Exception:
-        print("[Error] Server returned invalid JSON.")
-        print(response.text)
+@require_init
+def push_repo(path, parallel=1, batch_size=None, timeout=None, use_cache=True):
+    """Send committed Python files that changed since the last push to the server for analysis."""
+    staging_path = wit_subfolder(path, "staging")
+    last_commit = CommitManager(path).get_last_commit()
+    if _has_staged_files(staging_path) or not last_commit:
+        print("You must commit before pushing.")
         return
 
-    status = json_response.get("status")
-    errors = json_response.get("errors", [])
+    store = ObjectStore(path)
+    tree = store.read_tree(last_commit.tree)
+    files = {
+        f: (sha, lambda sha=sha: store.blob_size(sha), lambda sha=sha: store.open_blob(sha))
+        for f, sha in tree.items() if f.endswith(".py")
+    }
+    if not files:
+        print("[Notice] No Python files to analyze. Push aborted.")
+        return
+    upload_options = {"parallel": parallel, "batch_files": batch_size, "timeout": timeout}
+    _upload_python_files(path, files, "/alerts", PUSH_MESSAGES, upload_options, use_cache)
 
-    if status == "failed":
-        print("[Error] No Python files were analyzed.")
-        for err in errors:
-            print(f" - {err['file']}: {err['error']}")
-    elif status == "partial":
-        print("[Partial Success] Some files analyzed successfully.")
-        for err in errors:
-            print(f" - {err['file']}: {err['error']}")
-        print(json_response["message"])
-    elif status == "success":
-        print("[Success] All files analyzed successfully.")
-        print(json_response["message"])
-    else:
-        print("[Warning] Unknown response status from server.")
-        print(json_response)
+@require_init
+def analyze_only(path, parallel=1, batch_size=None, timeout=None, use_cache=True):
+    """Send .py files in the working directory that changed since the last analysis."""
+    index = Index(path)
+    with tracing.span("walk"):
+        records = {r.rel_path: r for r in walk_files(path, include_graphs=False) if r.rel_path.endswith(".py")}
+    hashes = index.hash_many({rel_path: record.stat() for rel_path, record in records.items()})
+    files = {
+        rel_path: (hashes[rel_path], lambda size=record.stat().st_size: size,
+                   lambda file_path=record.path: open(file_path, 'rb'))
+        for rel_path, record in records.items()
+    }
+    index.save()
+    if not files:
+        print("[Notice] No Python files to analyze. Analyze aborted.")
+        return
+    upload_options = {"parallel": parallel, "batch_files": batch_size, "timeout": timeout}
+    _upload_python_files(path, files, "/analyze", ANALYZE_MESSAGES, upload_options, use_cache)
+
+class Repository:
+    """A wit repository as an object, with its state cached between operations.
+
+    The functions above load the index, ignore rules, commits and HEAD tree from disk on
+    every call. A Repository loads them once and reuses them, which is what long-lived
+    callers (`wit daemon`, editor integrations) want. Operations that change the
+    repository drop the cached state afterwards.
+    """
+
+    def __init__(self, path):
+        """Open the repository at path (see Repository.init to create one)."""
+        self.path = os.fspath(path)
+        self._index = None
+        self._commits = None
+        self._store = None
+        self._head_tree = (None, {})
+
+    @classmethod
+    def init(cls, path):
+        """Create a new repository at path and open it."""
+        init_repo(path)
+        return cls(path)
+
+    def is_initialized(self):
+        """Check if path holds a wit repository."""
+        return os.path.exists(wit_subfolder(self.path))
+
+    @property
+    def index(self):
+        """The stat cache (loaded once; kept in memory)."""
+        if self._index is None:
+            self._index = Index(self.path)
+        return self._index
+
+    @property
+    def commits(self):
+        """The commit manager, with its database connection kept open."""
+        if self._commits is None:
+            self._commits = CommitManager(self.path)
+        return self._commits
+
+    @property
+    def store(self):
+        """The object store, with its pack files kept mapped."""
+        if self._store is None:
+            self._store = ObjectStore(self.path)
+        return self._store
+
+    @property
+    def ignore_rules(self):
+        """The working tree's ignore rules (re-read only when .witignore changes)."""
+        return get_ignore_rules(self.path)
+
+    def head(self):
+        """Return the commit HEAD points to, or None before the first commit."""
+        return self.commits.get_last_commit()
+
+    def head_tree(self):
+        """Return the tree of HEAD, cached until HEAD moves."""
+        head = self.head()
+        hash_code = head.hash_code if head else None
+        if self._head_tree[0] != hash_code:
+            self._head_tree = (hash_code, _get_committed_tree(self.store, head))
+        return self._head_tree[1]
+
+    def invalidate(self):
+        """Drop cached state after the repository changed."""
+        self.reopen_objects()
+        self._index = self._commits = None
+        self._head_tree = (None, {})
+
+    def reopen_objects(self):
+        """Forget open pack files, here and in diff, so objects repacked by another process are found."""
+        if self._store is not None:
+            self._store.close()
+            self._store = None
+        close_stores()
+
+    def scan(self):
+        """Return (working-tree hashes, staged hashes) for all non-ignored files."""
+        return _hash_working_and_staged_files(self.path, self.index)
+
+    def status(self, hashes=None):
+        """Return the status as sorted lists: staged, removed, modified and untracked files.
+
+        hashes may give (working-tree hashes, staged hashes) already known to the caller.
+        """
+        working_hashes, staged_hashes = hashes or self.scan()
+        removals = _read_staged_removals(self.path)
+        return _collect_status(working_hashes, staged_hashes, removals, self.head_tree())
+
+    def print_status(self, hashes=None):
+        """Print the status the way `wit status` does."""
+        _print_status(self.status(hashes))
+
+    def _run(self, func, *args, changes=True, **kwargs):
+        """Run a command function on this repository, dropping cached state if it changes it."""
+        try:
+            return func(self.path, *args, **kwargs)
+        finally:
+            if changes:
+                self.invalidate()
+
+    def add(self, name=os.curdir, **options):
+        """Stage a file or folder (`wit add`)."""
+        return self._run(add_repo, name, **options)
+
+    def add_all(self, **options):
+        """Stage every change in the working tree."""
+        return self._run(add_all_repo, **options)
+
+    def commit(self, message, **options):
+        """Commit the staged changes (`wit commit`)."""
+        return self._run(commit_repo, message, **options)
+
+    def checkout(self, revision, **options):
+        """Switch to a branch or commit (`wit checkout`)."""
+        return self._run(checkout_repo, revision, **options)
+
+    def branch(self, name=None):
+        """List branches, or create one (`wit branch`)."""
+        return self._run(branch_repo, name, changes=name is not None)
+
+    def log(self, revision=None, **options):
+        """Print the history (`wit log`)."""
+        return self._run(log_repo, revision, changes=False, **options)
+
+    def diff(self, revisions=(), **options):
+        """Print changes (`wit diff`)."""
+        return self._run(diff_repo, revisions, changes=False, **options)
+
+    def repack(self, prune=False):
+        """Pack all objects (`wit repack`, or `wit gc` with prune)."""
+        return self._run(repack_repo, prune=prune)
+
+    def fsck(self, repair=False, **options):
+        """Verify (and optionally repair) the repository (`wit fsck`)."""
+        return self._run(fsck_repo, repair=repair, changes=repair, **options)
+
+    def push(self, **options):
+        """Send the committed Python files for analysis (`wit push`)."""
+        return self._run(push_repo, changes=False, **options)
+
+    def analyze(self, **options):
+        """Analyze the working tree's Python files without committing (`wit analyze`)."""
+        return self._run(analyze_only, changes=False, **options)
@@ -0,0 +1,38 @@
+import re, sys, subprocess
+
+TOP_MODULES = 25
+IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)\s*$")
+
+
+def parse_import_times(text: str) -> list[tuple[str, int, int, int]]:
+    """Parse `python -X importtime` output into (module, self us, cumulative us, depth) rows."""
+    rows = []
+    for line in text.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            rows.append((module, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return rows
+
+
+def _ms(us: int) -> str:
+    """Format microseconds as milliseconds."""
+    return f"{us / 1000:8.1f}"
+
+
+def profile_startup(script: str, args: list[str]) -> int:
+    """Run wit with args under -X importtime and print the slowest imports; return its exit code."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", script, *args],
+        stdout=sys.stdout, stderr=subprocess.PIPE, text=True
+    )
+    rows = parse_import_times(result.stderr)
+    other = "\n".join(line for line in result.stderr.splitlines() if not line.startswith("import time:"))
+    if other:
+        print(other, file=sys.stderr)
+    total = sum(cumulative for _, _, cumulative, depth in rows if depth == 0)
+    print(f"\nImport time of `wit {' '.join(args)}`: {len(rows)} modules, {total / 1000:.1f} ms", file=sys.stderr)
+    print(f"{'cumul ms':>8} {'self ms':>8}  module", file=sys.stderr)
+    for module, self_us, cumulative_us, _ in sorted(rows, key=lambda row: -row[2])[:TOP_MODULES]:
+        print(f"{_ms(cumulative_us)} {_ms(self_us)}  {module}", file=sys.stderr)
+    return result.returncode
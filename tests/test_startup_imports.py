@@ -0,0 +1,44 @@
+"""
+Local commands must not load the network stack, the diff process pool or the daemon.
+
+Each command runs in its own interpreter under `python -X importtime`, which lists every
+module it imports; a module that shows up here means a lazy import was made eager again.
+"""
+
+import os, sys, subprocess
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+from startup_profile import parse_import_times
+
+WIT = os.path.join(REPO_ROOT, "wit.py")
+FORBIDDEN = ("requests", "urllib3", "concurrent.futures.process", "daemon")
+
+
+def _wit(repo, *args):
+    """Run a wit command in repo and return the names of the modules it imported."""
+    env = {k: v for k, v in os.environ.items() if k != "WIT_TRACE"}
+    result = subprocess.run([sys.executable, "-X", "importtime", WIT, *args], cwd=repo, env=env,
+                            capture_output=True, text=True)
+    assert result.returncode == 0, result.stdout + result.stderr
+    return {module for module, _, _, _ in parse_import_times(result.stderr)}
+
+
+@pytest.fixture(scope="module")
+def repo(tmp_path_factory):
+    """A repository with one commit and one modified file."""
+    path = tmp_path_factory.mktemp("repo")
+    (path / "main.py").write_text("print('hello')\n")
+    for args in (("init",), ("add", "."), ("commit", "-m", "initial")):
+        _wit(path, *args)
+    (path / "main.py").write_text("print('hello, world')\n")
+    return path
+
+
+@pytest.mark.parametrize("args", [("status",), ("log",), ("log", "--oneline")])
+def test_local_command_imports(repo, args):
+    modules = _wit(repo, *args)
+    assert "repository" in modules, "importtime output was not parsed"
+    loaded = [name for name in FORBIDDEN if name in modules]
+    assert not loaded, f"`wit {' '.join(args)}` imported {', '.join(loaded)}"
@@ -0,0 +1,157 @@
+"""
+Batching, retries and reply merging of the uploader, against the benchmark stub server.
+
+The handler below answers like the analysis server: files named bad* fail, a batch holding
+a file named drop* gets its connection closed without a reply, and the first
+server.fail_next requests get a 503.
+"""
+
+import io, os, re, sys, json, threading
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.join(REPO_ROOT, "benchmarks"))
+import uploader
+from uploader import Uploader, make_batches, merge_replies
+from stub_server import StubServer, StubHandler
+
+FILE_NAME = re.compile(rb'; filename="([^"]*)"')
+BATCH_FIELD = re.compile(rb'name="batch"\r\n\r\n([^\r]*)\r\n')
+
+
+class FlakyHandler(StubHandler):
+    """Fails bad* files, drops batches with drop* files and answers 503 while fail_next lasts."""
+
+    def do_POST(self):
+        body = self._read_body()
+        names = [name.decode() for name in FILE_NAME.findall(body)]
+        batch = BATCH_FIELD.search(body)
+        server = self.server
+        with server.lock:
+            server.received.append((names, batch.group(1).decode() if batch else None))
+            unavailable = server.fail_next > 0
+            server.fail_next -= unavailable
+        if unavailable:
+            self._reply(503, {"error": "try again"})
+        elif any(name.startswith("drop") for name in names):
+            self.close_connection = True
+        else:
+            bad = [name for name in names if name.startswith("bad")]
+            status = "success" if not bad else "failed" if len(bad) == len(names) else "partial"
+            self._reply(200, {
+                "status": status, "errors": [{"file": name, "error": "bad"} for name in bad],
+                "message": f"{len(names)} file(s)", "server_version": "test-1", **server.extra,
+            })
+
+    def _reply(self, code, reply):
+        data = json.dumps(reply).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def _files(*names, size=10):
+    """Return upload entries (name, size, opener) with size bytes of content each."""
+    return [(name, size, lambda: io.BytesIO(b"x" * size)) for name in names]
+
+
+@pytest.fixture(scope="module")
+def stub():
+    with StubServer(handler=FlakyHandler) as stub:
+        stub.httpd.lock = threading.Lock()
+        yield stub
+
+
+@pytest.fixture
+def server(stub, monkeypatch):
+    """The stub's server, reset, and the endpoint URL."""
+    monkeypatch.setattr(uploader, "RETRY_DELAY", 0)
+    stub.httpd.received = []
+    stub.httpd.fail_next = 0
+    stub.httpd.extra = {}
+    return stub.httpd, stub.url + "/analyze"
+
+
+def test_make_batches_limits_bytes_and_files():
+    files = _files("a", "b", "c", size=40) + _files("big", size=500) + _files("d", size=10)
+    assert [[f[0] for f in batch] for batch in make_batches(files, batch_bytes=100)] == \
+        [["a", "b"], ["c"], ["big"], ["d"]]
+    assert [[f[0] for f in batch] for batch in make_batches(files, batch_bytes=10 ** 6, batch_files=2)] == \
+        [["a", "b"], ["c", "big"], ["d"]]
+    assert make_batches([]) == [[]]
+
+
+@pytest.mark.parametrize("parallel", [1, 3])
+def test_upload_sends_every_batch_and_merges_success(server, parallel):
+    httpd, url = server
+    reply = Uploader(url, batch_files=2, parallel=parallel).upload([("project_root", "/p")], _files(*"abcde"))
+    assert reply["status"] == "success"
+    assert reply["errors"] == [] and reply["unanswered"] == []
+    assert reply["server_version"] == "test-1"
+    assert sorted(httpd.received) == [(["a", "b"], "1/3"), (["c", "d"], "2/3"), (["e"], "3/3")]
+
+
+def test_single_batch_reply_is_returned_as_is(server):
+    httpd, url = server
+    reply = Uploader(url).upload([], _files("a", "bad"))
+    assert reply["status"] == "partial"
+    assert reply["errors"] == [{"file": "bad", "error": "bad"}]
+    assert httpd.received == [(["a", "bad"], None)]
+
+
+def test_5xx_is_retried_per_batch(server):
+    httpd, url = server
+    httpd.fail_next = 2
+    reply = Uploader(url, retries=3).upload([], _files("a"))
+    assert reply["status"] == "success"
+    assert len(httpd.received) == 3
+
+
+def test_batch_without_reply_is_reported_unanswered(server):
+    httpd, url = server
+    reply = Uploader(url, retries=1, batch_files=2).upload([], _files("a", "bad", "drop"))
+    assert reply["status"] == "partial"
+    assert reply["errors"] == [
+        {"file": "bad", "error": "bad"}, {"file": "drop", "error": "no response from server"},
+    ]
+    assert reply["unanswered"] == ["drop"]
+    # The dropped batch was sent once and retried once; the answered one only once.
+    assert [names for names, _ in httpd.received].count(["drop"]) == 2
+    assert [names for names, _ in httpd.received].count(["a", "bad"]) == 1
+
+
+def test_all_batches_failing_merge_to_failed(server):
+    httpd, url = server
+    reply = Uploader(url, batch_files=1).upload([], _files("bad1", "bad2"))
+    assert reply["status"] == "failed"
+    assert [err["file"] for err in reply["errors"]] == ["bad1", "bad2"]
+
+
+def test_no_reply_at_all_is_none(server):
+    httpd, url = server
+    assert Uploader(url, retries=0, batch_files=1).upload([], _files("drop1", "drop2")) is None
+
+
+def test_full_upload_required_from_any_batch(server):
+    httpd, url = server
+    httpd.extra = {"full_upload_required": True}
+    reply = Uploader(url, batch_files=1).upload([], _files("a", "b"))
+    assert reply["full_upload_required"] is True
+
+
+def test_merge_replies_without_server():
+    batches = [_files("a"), _files("b"), _files("c")]
+    replies = [
+        {"status": "success", "errors": [], "message": "ok"},
+        {"status": "weird", "errors": [], "message": "ok", "server_version": "v2"},
+        None,
+    ]
+    merged = merge_replies(batches, replies)
+    assert merged["status"] == "partial"
+    assert merged["message"] == "ok"
+    assert merged["server_version"] == "v2"
+    assert merged["unanswered"] == ["c"]
+    assert merged["full_upload_required"] is False
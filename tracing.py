@@ -0,0 +1,159 @@
+"""
+Lightweight tracing: timed spans and counters around wit's hot paths.
+
+Tracing is off unless `wit --trace` / `--trace-json FILE` is given or WIT_TRACE is set
+(`WIT_TRACE=1` for a summary, `WIT_TRACE=out.json` for a Chrome trace). While it is off,
+span() returns a shared no-op context manager and count() returns at once.
+"""
+
+import os, sys, json, time, atexit, threading
+from collections import Counter
+
+ENABLED = False
+_spans = []
+_counters = Counter()
+_lock = threading.Lock()
+_started = 0
+_json_path = None
+_io_at_start = {}
+_times_at_start = None
+
+
+class _NullSpan:
+    """The span used while tracing is off."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    """Records how long its with-block took."""
+
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter_ns()
+        with _lock:
+            _spans.append((self.name, self.start, end - self.start, threading.get_ident()))
+        return False
+
+
+def span(name: str):
+    """Time a with-block under name."""
+    return _Span(name) if ENABLED else _NULL_SPAN
+
+
+def count(name: str, amount: int = 1):
+    """Add amount to a counter."""
+    if ENABLED and amount:
+        with _lock:
+            _counters[name] += amount
+
+
+def _proc_io() -> dict:
+    """Read this process's syscall and byte counters (Linux only; {} elsewhere)."""
+    try:
+        with open("/proc/self/io") as file:
+            return {key: int(value) for key, value in (line.split(": ") for line in file.read().splitlines())}
+    except OSError:
+        return {}
+
+
+def enable(json_path: str | None = None):
+    """Start tracing; report when the process exits (as Chrome-trace JSON if json_path is given)."""
+    global ENABLED, _started, _json_path, _io_at_start, _times_at_start
+    if ENABLED:
+        return
+    ENABLED = True
+    _json_path = json_path
+    _started = time.perf_counter_ns()
+    _io_at_start = _proc_io()
+    _times_at_start = os.times()
+    atexit.register(_report)
+
+
+def enable_from_env():
+    """Start tracing if WIT_TRACE asks for it."""
+    value = os.environ.get("WIT_TRACE", "")
+    if value.lower().endswith(".json"):
+        enable(value)
+    elif value and value != "0":
+        enable()
+
+
+def _process_stats() -> dict:
+    """Collect process numbers since tracing started: wall and CPU time, syscalls and I/O, plus peak memory."""
+    stats = {"wall ms": (time.perf_counter_ns() - _started) / 1e6}
+    times = os.times()
+    stats["user CPU ms"] = (times.user - _times_at_start.user) * 1000
+    stats["system CPU ms"] = (times.system - _times_at_start.system) * 1000
+    try:
+        import resource
+        # Kilobytes on Linux, bytes on macOS.
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        stats["peak RSS MB"] = peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    except ImportError:
+        pass
+    io = _proc_io()
+    for key, label in (("syscr", "read syscalls"), ("syscw", "write syscalls"),
+                       ("rchar", "bytes read"), ("wchar", "bytes written")):
+        if key in io:
+            stats[label] = io[key] - _io_at_start.get(key, 0)
+    return stats
+
+
+def _summary_lines(stats: dict) -> list[str]:
+    """Format spans, counters and process stats as a table."""
+    totals = {}
+    for name, _, duration, _ in _spans:
+        calls, total, longest = totals.get(name, (0, 0, 0))
+        totals[name] = (calls + 1, total + duration, max(longest, duration))
+    wall = stats["wall ms"]
+    lines = [f"{'span':<28} {'calls':>7} {'total ms':>10} {'max ms':>9} {'% wall':>7}"]
+    for name, (calls, total, longest) in sorted(totals.items(), key=lambda item: -item[1][1]):
+        share = total / 1e6 / wall * 100 if wall else 0
+        lines.append(f"{name:<28} {calls:>7} {total / 1e6:>10.2f} {longest / 1e6:>9.2f} {share:>6.1f}%")
+    if _counters:
+        lines.append("")
+        lines.append(f"{'counter':<28} {'value':>12}")
+        lines += [f"{name:<28} {value:>12}" for name, value in sorted(_counters.items())]
+    lines.append("")
+    lines += [f"{name:<28} {value:>12.1f}" if isinstance(value, float) else f"{name:<28} {value:>12}"
+              for name, value in stats.items()]
+    return lines
+
+
+def _chrome_trace(stats: dict) -> dict:
+    """Build a Chrome trace (chrome://tracing, Perfetto) of the spans, with counters as metadata."""
+    pid = os.getpid()
+    events = [
+        {"name": name, "cat": "wit", "ph": "X", "ts": (start - _started) / 1000, "dur": duration / 1000,
+         "pid": pid, "tid": tid}
+        for name, start, duration, tid in _spans
+    ]
+    return {"traceEvents": events, "displayTimeUnit": "ms",
+            "otherData": {"command": " ".join(sys.argv[1:]), "counters": dict(_counters), **stats}}
+
+
+def _report():
+    """Print the summary to stderr, or write the Chrome trace."""
+    stats = _process_stats()
+    if _json_path:
+        with open(_json_path, "w") as file:
+            json.dump(_chrome_trace(stats), file)
+        print(f"wit: trace written to {_json_path}", file=sys.stderr)
+    else:
+        print("\n".join(["", "=== Trace ==="] + _summary_lines(stats)), file=sys.stderr)
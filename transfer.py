@@ -0,0 +1,137 @@
+import os, sys, stat, shutil
+from concurrent.futures import ThreadPoolExecutor
+import tracing
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+DEFAULT_JOBS = min(8, os.cpu_count() or 1)
+COPY_RANGE_SIZE = 64 * 1024 * 1024
+# ioctl that makes a file share another file's data blocks copy-on-write (Btrfs, XFS, bcachefs).
+FICLONE = 0x40049409
+REFLINK_PLATFORM = fcntl is not None and sys.platform.startswith("linux")
+# Devices where a reflink failed once; they are not tried again in this process.
+_no_reflink_devices = set()
+
+
+def _reflink(source_path: str, dest_path: str) -> bool:
+    """Clone a file's data with the FICLONE ioctl (no data is copied); False if unsupported."""
+    if not REFLINK_PLATFORM:
+        return False
+    with open(source_path, "rb") as src:
+        device = os.fstat(src.fileno()).st_dev
+        if device in _no_reflink_devices:
+            return False
+        with open(dest_path, "wb") as dst:
+            try:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+            except OSError:
+                _no_reflink_devices.add(device)
+                return False
+    return True
+
+
+def _copy_in_kernel(source_path: str, dest_path: str) -> bool:
+    """Copy file data with copy_file_range (no user-space buffers); False if unsupported."""
+    copy_range = getattr(os, "copy_file_range", None)
+    if copy_range is None:
+        return False
+    with open(source_path, "rb") as src, open(dest_path, "wb") as dst:
+        try:
+            while copy_range(src.fileno(), dst.fileno(), COPY_RANGE_SIZE):
+                pass
+        except OSError:
+            return False
+    return True
+
+
+def copy_fast(source_path: str, dest_path: str, writable: bool = False):
+    """Copy one file with its metadata; the parent folder must already exist.
+
+    Tries a reflink first, then an in-kernel copy, then a plain copy. An existing
+    destination is replaced rather than overwritten, since it may be a hard link to a
+    stored object. With writable, the copy gets owner write permission even if the
+    source (e.g. a read-only object) has none.
+    """
+    try:
+        os.unlink(dest_path)
+    except FileNotFoundError:
+        pass
+    if _reflink(source_path, dest_path):
+        tracing.count("files reflinked")
+    elif _copy_in_kernel(source_path, dest_path):
+        tracing.count("files copied")
+    else:
+        # shutil.copyfile uses sendfile on Linux and fcopyfile on macOS.
+        shutil.copyfile(source_path, dest_path)
+        tracing.count("files copied")
+    if tracing.ENABLED:
+        tracing.count("bytes copied", os.path.getsize(dest_path))
+    shutil.copystat(source_path, dest_path)
+    if writable:
+        os.chmod(dest_path, stat.S_IMODE(os.stat(dest_path).st_mode) | stat.S_IWUSR)
+
+
+def link_or_copy(source_path: str, dest_path: str):
+    """Hard-link a file, or copy it where links are not possible (e.g. across file systems).
+
+    Only for files nobody edits in place afterwards: both names share the same data.
+    """
+    try:
+        os.link(source_path, dest_path)
+        tracing.count("files hard-linked")
+    except OSError:
+        copy_fast(source_path, dest_path)
+
+
+def make_read_only(file_path: str):
+    """Drop write permission from a stored object (kept on Windows, where it blocks deletion)."""
+    if os.name != "nt":
+        os.chmod(file_path, stat.S_IMODE(os.stat(file_path).st_mode) & ~(stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH))
+
+
+def fsync_file(file_path: str):
+    """Flush a file's content to disk."""
+    fd = os.open(file_path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def fsync_folder(folder_path: str):
+    """Flush a folder's entries (e.g. a rename into it) to disk; a no-op on Windows."""
+    if os.name == "nt":
+        return
+    fd = os.open(folder_path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def map_parallel(func, items, jobs: int | None = None) -> list:
+    """Apply func to every item on a thread pool and return the results in order."""
+    items = list(items)
+    jobs = jobs or DEFAULT_JOBS
+    if jobs <= 1 or len(items) < 2:
+        return [func(item) for item in items]
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        return list(pool.map(func, items))
+
+
+def make_parent_folders(dest_paths):
+    """Create every distinct parent folder of the given paths once."""
+    for parent in sorted({os.path.dirname(p) for p in dest_paths}):
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+
+
+def copy_files(pairs, jobs: int | None = None, writable: bool = False) -> int:
+    """Copy (source, destination) pairs concurrently and return how many were copied."""
+    pairs = list(pairs)
+    with tracing.span("copy files"):
+        make_parent_folders(dst for _, dst in pairs)
+        map_parallel(lambda pair: copy_fast(*pair, writable=writable), pairs, jobs)
+    return len(pairs)
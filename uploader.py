@@ -0,0 +1,196 @@
+import time, uuid, random, threading
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from requests.exceptions import RequestException, HTTPError
+import tracing
+
+CHUNK_SIZE = 256 * 1024
+BATCH_BYTES = 16 * 1024 * 1024
+RETRIES = 3
+RETRY_DELAY = 0.5
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 300
+
+_sessions = threading.local()
+
+
+def get_session() -> requests.Session:
+    """Return this thread's keep-alive session with a connection pool."""
+    session = getattr(_sessions, "session", None)
+    if session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        _sessions.session = session
+    return session
+
+
+def _quote(value: str) -> str:
+    """Escape a multipart header parameter the way urllib3 does."""
+    return value.replace("\\", "\\\\").replace('"', "%22")
+
+
+class MultipartBody:
+    """A multipart/form-data body that reads its files lazily, chunk by chunk, while it is sent."""
+
+    def __init__(self, fields: list[tuple[str, str]], files: list[tuple[str, int, object]]):
+        """Fields are (name, value); files are (file name, size, opener returning a binary file)."""
+        self.fields = fields
+        self.files = files
+        self.boundary = uuid.uuid4().hex
+
+    @property
+    def content_type(self) -> str:
+        """Return the Content-Type header value, including the boundary."""
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def _part_header(self, name: str, file_name: str | None = None) -> bytes:
+        """Return the boundary line and headers that start one part."""
+        disposition = f'form-data; name="{_quote(name)}"'
+        if file_name is None:
+            return f"--{self.boundary}\r\nContent-Disposition: {disposition}\r\n\r\n".encode()
+        disposition += f'; filename="{_quote(file_name)}"'
+        return (
+            f"--{self.boundary}\r\nContent-Disposition: {disposition}\r\n"
+            "Content-Type: application/octet-stream\r\n\r\n"
+        ).encode()
+
+    def __iter__(self):
+        """Yield the body; can be iterated again to resend it."""
+        for piece in self._pieces():
+            tracing.count("bytes uploaded", len(piece))
+            yield piece
+
+    def _pieces(self):
+        """Yield the parts of the body in order, reading files chunk by chunk."""
+        for name, value in self.fields:
+            yield self._part_header(name) + value.encode() + b"\r\n"
+        for file_name, _, opener in self.files:
+            yield self._part_header("files", file_name)
+            with opener() as file:
+                for chunk in iter(lambda: file.read(CHUNK_SIZE), b""):
+                    yield chunk
+            yield b"\r\n"
+        yield f"--{self.boundary}--\r\n".encode()
+
+
+def make_batches(files: list[tuple[str, int, object]], batch_bytes: int = BATCH_BYTES,
+                 batch_files: int | None = None) -> list[list]:
+    """Split files into batches of at most batch_bytes and batch_files (a larger file gets its own batch)."""
+    batches = [[]]
+    size = 0
+    for file in files:
+        full = batch_files is not None and len(batches[-1]) >= batch_files
+        if batches[-1] and (full or size + file[1] > batch_bytes):
+            batches.append([])
+            size = 0
+        batches[-1].append(file)
+        size += file[1]
+    return batches
+
+
+class Uploader:
+    """Streams files to a server endpoint in bounded batches, sent concurrently and retried one by one."""
+
+    def __init__(self, server_url: str, batch_bytes: int = BATCH_BYTES, retries: int = RETRIES,
+                 parallel: int = 1, batch_files: int | None = None, timeout: float | None = None):
+        """Initialize with the endpoint URL, batch limits, retry count, concurrency and read timeout."""
+        self.server_url = server_url
+        self.batch_bytes = batch_bytes
+        self.batch_files = batch_files
+        self.retries = retries
+        self.parallel = max(1, parallel)
+        self.timeout = (CONNECT_TIMEOUT, timeout or READ_TIMEOUT)
+
+    def _post(self, body: MultipartBody):
+        """Send one body, retrying network errors and 5xx replies; return the response or None."""
+        response = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                tracing.count("http retries")
+                time.sleep(RETRY_DELAY * 2 ** (attempt - 1) * random.uniform(1, 1.5))
+            try:
+                tracing.count("http requests")
+                with tracing.span("http POST"):
+                    response = get_session().post(
+                        self.server_url, data=body, headers={"Content-Type": body.content_type},
+                        timeout=self.timeout
+                    )
+                tracing.count("bytes downloaded", len(response.content))
+                response.raise_for_status()
+                return response
+            except HTTPError as e:
+                response = e.response
+                if response.status_code < 500:
+                    return response
+            except RequestException as e:
+                print(f"[Error] Network error: {e}")
+                response = None
+        return response
+
+    def _send_batch(self, fields, batch) -> dict | None:
+        """Send one batch and return the server's JSON reply, or None on error."""
+        response = self._post(MultipartBody(fields, batch))
+        if response is None:
+            print("[Error] No response received from server.")
+            return None
+        try:
+            return response.json()
+        except Exception:
+            print("[Error] Server returned invalid JSON.")
+            print(response.text)
+            return None
+
+    def upload(self, fields: list[tuple[str, str]], files: list[tuple[str, int, object]]) -> dict | None:
+        """Upload all files and return one merged reply (None if nothing came back)."""
+        batches = make_batches(files, self.batch_bytes, self.batch_files)
+
+        def send(numbered):
+            number, batch = numbered
+            batch_fields = fields + ([("batch", f"{number}/{len(batches)}")] if len(batches) > 1 else [])
+            return self._send_batch(batch_fields, batch)
+
+        numbered = list(enumerate(batches, start=1))
+        if self.parallel == 1 or len(batches) == 1:
+            replies = [send(item) for item in numbered]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.parallel, len(batches))) as pool:
+                replies = list(pool.map(send, numbered))
+        return merge_replies(batches, replies)
+
+
+def merge_replies(batches: list[list], replies: list[dict | None]) -> dict | None:
+    """Merge per-batch replies into one success/partial/failed reply."""
+    if len(replies) == 1:
+        return replies[0]
+    if all(reply is None for reply in replies):
+        return None
+    statuses, errors, messages, unanswered = [], [], [], []
+    for batch, reply in zip(batches, replies):
+        if reply is None:
+            statuses.append("failed")
+            errors += [{"file": name, "error": "no response from server"} for name, _, _ in batch]
+            unanswered += [name for name, _, _ in batch]
+            continue
+        statuses.append(reply.get("status") if reply.get("status") in ("success", "partial") else "failed")
+        errors += reply.get("errors", [])
+        if reply.get("message") and reply["message"] not in messages:
+            messages.append(reply["message"])
+    if all(status == "success" for status in statuses):
+        status = "success"
+    elif all(status == "failed" for status in statuses):
+        status = "failed"
+    else:
+        status = "partial"
+    answered = [reply for reply in replies if reply]
+    return {
+        "status": status,
+        "errors": errors,
+        # Files whose batch got no reply: their errors are not results and must not be cached.
+        "unanswered": unanswered,
+        "message": "\n".join(messages),
+        "full_upload_required": any(reply.get("full_upload_required") for reply in answered),
+        "server_version": next((r["server_version"] for r in answered if r.get("server_version")), None),
+    }
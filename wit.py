@@ -6,16 +6,38 @@ Provides commands similar to Git: init, add, commit, status, log, checkout, push
 import click
 from repository import (
     init_repo, add_repo, commit_repo, log_repo,
-    status_repo, checkout_repo, push_repo, add_all_repo, analyze_only
+    status_repo, checkout_repo, push_repo, add_all_repo, analyze_only,
+    repack_repo, branch_repo, diff_repo, fsck_repo, export_csv_repo
 )
+from daemon_client import run_via_daemon
 from pathlib import Path
+import sys
+import tracing
+
+def profile_startup_option(ctx, param, value):
+    """
+    Re-run the command under `python -X importtime` and report the slowest imports.
+    """
+    if not value or ctx.resilient_parsing:
+        return
+    from startup_profile import profile_startup
+    args = [arg for arg in sys.argv[1:] if arg != '--profile-startup']
+    ctx.exit(profile_startup(sys.argv[0], args))
 
 @click.group()
-def cli():
+@click.option('--profile-startup', is_flag=True, expose_value=False, is_eager=True,
+              callback=profile_startup_option, help='Report the import time of each module for the given command')
+@click.option('--trace', is_flag=True, help='Print time spent per phase and counters to stderr after the command')
+@click.option('--trace-json', type=click.Path(dir_okay=False), default=None,
+              help='Write a Chrome trace (chrome://tracing, Perfetto) of the command to this file')
+def cli(trace, trace_json):
     """
     Entry point for the Wit CLI commands.
     """
-    pass
+    if trace or trace_json:
+        tracing.enable(trace_json)
+    else:
+        tracing.enable_from_env()
 
 @cli.command()
 def init():
@@ -25,27 +47,35 @@ def init():
     path = Path.cwd()
     init_repo(path)
 
+jobs_option = click.option(
+    '-j', '--jobs', type=click.IntRange(min=1), default=None,
+    help='Number of files to process in parallel (default: based on CPU count)'
+)
+
 @cli.command()
 @click.argument('file_name')
-def add(file_name):
+@jobs_option
+@click.option('--dry-run', is_flag=True, help='List what would be staged without staging it')
+def add(file_name, jobs, dry_run):
     """
-    Add a file or folder to the staging area.
+    Add new or modified files from a file or folder to the staging area.
     Use '.' to add all files.
     """
     path = Path.cwd()
     if file_name == '.':
-        add_all_repo(path)
+        add_all_repo(path, jobs=jobs, dry_run=dry_run)
     else:
-        add_repo(path, file_name)
+        add_repo(path, file_name, jobs=jobs, dry_run=dry_run)
 
 @cli.command()
 @click.option('-m', '--message', required=True, help='Commit message')
-def commit(message):
+@jobs_option
+def commit(message, jobs):
     """
     Create a new commit with staged changes and a commit message.
     """
     path = Path.cwd()
-    commit_repo(path, message)
+    commit_repo(path, message, jobs=jobs)
 
 @cli.command()
 def status():
@@ -53,40 +83,150 @@ def status():
     Show the current status of the working directory and staging area.
     """
     path = Path.cwd()
-    status_repo(path)
+    if not run_via_daemon(path, "status"):
+        status_repo(path)
+
+DATE_FORMATS = ['%Y-%m-%d', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M:%S']
+
+@cli.command()
+@click.argument('revision', required=False)
+@click.option('-n', '--max-count', type=click.IntRange(min=0), default=None,
+              help='Show at most this many commits')
+@click.option('--since', type=click.DateTime(DATE_FORMATS), help='Show commits made at or after this date')
+@click.option('--until', type=click.DateTime(DATE_FORMATS), help='Show commits made at or before this date')
+@click.option('--grep', help='Show commits whose message matches this regular expression')
+@click.option('--oneline', is_flag=True, help='Show each commit as "<hash> <message>" on one line')
+def log(revision, max_count, since, until, grep, oneline):
+    """
+    Display the commit history of the current branch (or REVISION), newest first.
+    """
+    path = Path.cwd()
+    options = dict(limit=max_count, since=since, until=until, grep=grep, oneline=oneline)
+    dates = {key: options[key].isoformat() for key in ("since", "until") if options[key]}
+    if not run_via_daemon(path, "log", revision=revision, **{**options, **dates}):
+        log_repo(path, revision, **options)
+
+@cli.command()
+@click.argument('version_hash_code', metavar='BRANCH|HASH')
+@jobs_option
+def checkout(version_hash_code, jobs):
+    """
+    Switch the working directory to a branch or a specific commit version.
+    """
+    path = Path.cwd()
+    checkout_repo(path, version_hash_code, jobs=jobs)
+
+@cli.command()
+@click.argument('name', required=False)
+def branch(name):
+    """
+    List branches, or create a new branch at the current commit.
+    """
+    path = Path.cwd()
+    branch_repo(path, name)
 
 @cli.command()
-def log():
+@click.argument('revisions', nargs=-1, metavar='[COMMIT [COMMIT]]')
+@click.option('--staged', '--cached', 'staged', is_flag=True,
+              help='Compare the staging area with HEAD (or COMMIT)')
+@click.option('--stat', is_flag=True, help='Only show how many lines changed per file')
+@jobs_option
+def diff(revisions, staged, stat, jobs):
     """
-    Display the commit history of the repository.
+    Show changes between the working tree, the staging area and commits.
     """
     path = Path.cwd()
-    log_repo(path)
+    options = dict(staged=staged, stat=stat, jobs=jobs)
+    if not run_via_daemon(path, "diff", revisions=revisions, **options):
+        diff_repo(path, revisions, **options)
 
 @cli.command()
-@click.argument('version_hash_code')
-def checkout(version_hash_code):
+@click.option('--repair', is_flag=True, help='Fix the problems that can be fixed')
+@jobs_option
+def fsck(repair, jobs):
     """
-    Restore files in the working directory to a specific commit version.
+    Verify the integrity of objects, commits and branches.
     """
     path = Path.cwd()
-    checkout_repo(path, version_hash_code)
+    fsck_repo(path, repair=repair, jobs=jobs)
+
+@cli.command()
+@click.option('--stop', is_flag=True, help='Stop the running daemon')
+def daemon(stop):
+    """
+    Keep repository state in memory and answer status, log and diff over a local socket.
+    """
+    from daemon import run_daemon, stop_daemon
+    path = Path.cwd()
+    if stop:
+        stop_daemon(path)
+    else:
+        run_daemon(path)
+
+@cli.command('export-csv')
+@click.argument('csv_file', type=click.Path(dir_okay=False))
+def export_csv(csv_file):
+    """
+    Write the commit history (hash, message, timestamp per row) to a CSV file.
+    """
+    path = Path.cwd()
+    export_csv_repo(path, csv_file)
+
+@cli.command()
+def repack():
+    """
+    Compress committed files into a pack file, storing revisions as deltas.
+    """
+    path = Path.cwd()
+    repack_repo(path)
+
+@cli.command()
+def gc():
+    """
+    Repack committed files and drop objects no commit refers to.
+    """
+    path = Path.cwd()
+    repack_repo(path, prune=True)
+
+def upload_options(command):
+    """
+    Options controlling how files are sharded across requests to the server.
+    """
+    command = click.option(
+        '--no-cache', is_flag=True,
+        help='Ignore locally cached analysis results and ask the server again'
+    )(command)
+    command = click.option(
+        '--timeout', type=click.FloatRange(min=0, min_open=True), default=None,
+        help='Seconds to wait for each server reply (default: 300)'
+    )(command)
+    command = click.option(
+        '--batch-size', type=click.IntRange(min=1), default=None,
+        help='Maximum number of files per request'
+    )(command)
+    command = click.option(
+        '--parallel', type=click.IntRange(min=1), default=1,
+        help='Number of requests to send concurrently'
+    )(command)
+    return command
 
 @cli.command()
-def push():
+@upload_options
+def push(parallel, batch_size, timeout, no_cache):
     """
     Push committed code to an external server for code analysis.
     """
     path = Path.cwd()
-    push_repo(path)
+    push_repo(path, parallel=parallel, batch_size=batch_size, timeout=timeout, use_cache=not no_cache)
 
 @cli.command()
-def analyze():
+@upload_options
+def analyze(parallel, batch_size, timeout, no_cache):
     """
     Analyze Python files in the working directory using an external server.
     """
     path = Path.cwd()
-    analyze_only(path)
+    analyze_only(path, parallel=parallel, batch_size=batch_size, timeout=timeout, use_cache=not no_cache)
 
 if __name__ == '__main__':
     cli()